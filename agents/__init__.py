@@ -1 +1,17 @@
-from agents.montecarlo import simulate_games
+from agents.montecarlo import simulate_games, simulate_games_parallel, profile_simulate_games
+from agents.batched import BatchedPlayouts, batched_win_counts, simulate_games_batched
+from agents.mcts import MCTSAgent
+from agents.parallel_mcts import ParallelMCTSAgent
+from agents.alphabeta import AlphaBetaAgent
+from agents.evaluators import Evaluator, ShortestPathEvaluator, MLPEvaluator
+from agents.selfplay import generate_selfplay
+from agents.book import OpeningBook, BookBuilder, build_book
+
+# The built-in agents by name, for the arena and the server: AGENTS[name](time_limit, rng) searches time_limit seconds a move
+AGENTS = {
+    "mcts": lambda time_limit, rng=None: MCTSAgent(iterations=None, time_limit=time_limit, rng=rng),
+    "mcts-sp": lambda time_limit, rng=None: MCTSAgent(iterations=None, time_limit=time_limit, rng=rng,
+                                                      evaluator=ShortestPathEvaluator()),
+    "alphabeta": lambda time_limit, rng=None: AlphaBetaAgent(time_limit=time_limit),
+    "alphabeta-sp": lambda time_limit, rng=None: AlphaBetaAgent(time_limit=time_limit, evaluator=ShortestPathEvaluator()),
+}
@@ -0,0 +1,263 @@
+from __future__ import annotations
+import time
+import domain.actions as actions
+from domain.actions import WallAction
+from domain.engine import load as load_engine
+from domain.state import QuoridorState
+from agents.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+WIN_SCORE = 100000
+MAX_PLY = 128
+NODES_BETWEEN_CLOCK_CHECKS = 256
+# Evaluator values in [-1, 1] are scaled to this, far below the win scores
+EVALUATOR_SCALE = 100.0
+# Scores beyond this are wins or losses a known number of plies away rather than evaluations
+WIN_THRESHOLD = WIN_SCORE // 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(state: QuoridorState, wall_weight: float = 1.0) -> float:
+    """Shortest goal distance of the opponent minus our own, plus a bonus per wall in hand, for the agent to move"""
+    me = state.agent_to_move
+    opponent = 1 - me
+    my_distance = state.distance_to_goal(me)
+    opponent_distance = state.distance_to_goal(opponent)
+    return (opponent_distance - my_distance) + wall_weight * (state.walls_left[me] - state.walls_left[opponent])
+
+
+def score_to_table(score: float, ply: int) -> float:
+    """
+    Win scores count the plies from the root; the transposition table keeps them counted from the node instead,
+    so that an entry holds whatever ply it is found at again
+    """
+    if score >= WIN_THRESHOLD:
+        return score + ply
+    if score <= -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_table(score: float, ply: int) -> float:
+    if score >= WIN_THRESHOLD:
+        return score - ply
+    if score <= -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+class AlphaBetaAgent:
+    """
+    Negamax with alpha-beta pruning and iterative deepening under a time budget.
+    Moves are ordered principal variation first, then the transposition table move, then killer moves.
+    Walls are only tried next to the cells of the pawns' shortest paths.
+    After every search, last_depth, last_nodes and last_nodes_per_second describe what it did.
+    With an evaluator (see agents.evaluators), the children of every depth 1 node are valued by it in one batch.
+    `book` and `engine` are as for agents.mcts.MCTSAgent.
+    """
+
+    def __init__(self, time_limit: float = 1.0, max_depth: int = MAX_PLY, wall_weight: float = 1.0,
+                 transposition_table: TranspositionTable = None, verbose: bool = False, book=None, evaluator=None,
+                 engine=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.wall_weight = wall_weight
+        self.table = transposition_table if transposition_table is not None else TranspositionTable(1 << 18)
+        self.verbose = verbose
+        self.book = book
+        self.evaluator = evaluator
+        self.engine = engine if engine is not None else load_engine()
+        self.board = self.engine.board
+        self.race = self.engine.race
+        # Actions of this engine's library: its pawn actions, and its walls by wall id
+        self.pawn_actions = [action for action in self.engine.DEFAULT_QUORIDOR_ACTION_LIBRARY
+                             if not isinstance(action, self.engine.WallAction)]
+        self.walls_by_id = {action.wall_id: action for action in self.engine.WALL_ACTIONS}
+        self.last_depth = 0
+        self.last_nodes = 0
+        self.last_nodes_per_second = 0.0
+        self.last_score = 0.0
+        self.principal_variation = []
+
+    def get_action(self, state: QuoridorState) -> actions.AnyAction:
+        if self.book is not None:
+            action = self.book.best_action(state)
+            if action is not None:
+                self.last_depth = self.last_nodes = 0
+                self.principal_variation = [action]
+                return action
+        if self.race.is_race(state) and not state.is_terminal():
+            # Without walls left the race solver knows the exact result and the best move
+            action = self.race.solve(state).action
+            self.last_depth = self.last_nodes = 0
+            self.principal_variation = [action]
+            return action
+        board_state = state.detached_copy()
+        self.table.new_search()
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_limit
+        start = time.perf_counter()
+        previous_pv = []
+        best_action = None
+        for depth in range(1, self.max_depth + 1):
+            self.previous_pv = previous_pv
+            try:
+                score, pv = self._negamax(board_state, depth, 0, -WIN_SCORE - 1, WIN_SCORE + 1, True)
+            except SearchTimeout:
+                # The board copy is left mid-search, with moves applied and the other agent to move
+                break
+            previous_pv = pv
+            best_action = pv[0] if pv else best_action
+            self.last_depth = depth
+            self.last_score = score
+            if abs(score) >= WIN_SCORE - MAX_PLY:
+                break
+        elapsed = time.perf_counter() - start
+        self.last_nodes = self.nodes
+        self.last_nodes_per_second = self.nodes / elapsed if elapsed > 0 else 0.0
+        self.principal_variation = previous_pv
+        if best_action is None:
+            # Timed out before depth 1 finished: the first move in search order, from the position as given
+            best_action = self.ordered_actions(state, 0, None)[0]
+        if self.verbose:
+            print("depth %i, score %.1f, %i nodes, %.0f nodes/s, pv %s" % (
+                self.last_depth, self.last_score, self.last_nodes, self.last_nodes_per_second, previous_pv))
+        return best_action
+
+    def _negamax(self, state: QuoridorState, depth: int, ply: int, alpha: float, beta: float, on_pv: bool):
+        self.nodes += 1
+        if self.nodes % NODES_BETWEEN_CLOCK_CHECKS == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if state.is_terminal():
+            # The agent that just moved has reached its goal
+            return -(WIN_SCORE - ply), []
+        if self.race.is_race(state):
+            # Solving a new wall layout takes milliseconds, far longer than the nodes between clock checks
+            if time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            value, plies = self.race.outcome(state)
+            if value == self.race.DRAW:
+                return 0.0, []
+            return value * (WIN_SCORE - ply - plies), []
+        if depth == 0:
+            return evaluate(state, self.wall_weight), []
+
+        original_alpha = alpha
+        entry = self.table.probe(state.key)
+        table_action = None
+        if entry is not None:
+            table_action = entry.best_action
+            if entry.depth >= depth and not on_pv:
+                value = score_from_table(entry.value, ply)
+                if entry.flag == EXACT:
+                    return value, [table_action] if table_action else []
+                if entry.flag == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                elif entry.flag == UPPER_BOUND:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value, [table_action] if table_action else []
+
+        pv_action = self.previous_pv[ply] if on_pv and ply < len(self.previous_pv) else None
+        if depth == 1 and self.evaluator is not None:
+            return self._evaluate_children(state, ply, self.ordered_actions(state, ply, pv_action or table_action))
+        best_score = -WIN_SCORE - 1
+        best_pv = []
+        for action in self.ordered_actions(state, ply, pv_action or table_action):
+            state.apply(action)
+            score, child_pv = self._negamax(state, depth - 1, ply + 1, -beta, -alpha, on_pv and action is pv_action)
+            score = -score
+            state.undo()
+            if score > best_score:
+                best_score = score
+                best_pv = [action] + child_pv
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                killers = self.killers[ply]
+                if killers[0] is not action:
+                    killers[1] = killers[0]
+                    killers[0] = action
+                break
+
+        flag = EXACT
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        self.table.store(state.key, depth, score_to_table(best_score, ply), flag, best_pv[0] if best_pv else None)
+        return best_score, best_pv
+
+    def _evaluate_children(self, state: QuoridorState, ply: int, ordered: list[actions.AnyAction]):
+        """
+        A depth 1 node searched with the evaluator: every child is scored, finished games and races exactly
+        and the rest in one evaluate call, so there is no pruning and the score is exact for this depth.
+        """
+        scores = []
+        pending = []
+        children = []
+        for action in ordered:
+            self.nodes += 1
+            state.apply(action)
+            if state.is_terminal():
+                score = WIN_SCORE - ply - 1
+            elif self.race.is_race(state):
+                if time.perf_counter() > self.deadline:
+                    state.undo()
+                    raise SearchTimeout()
+                value, plies = self.race.outcome(state)
+                score = 0.0 if value == self.race.DRAW else -value * (WIN_SCORE - ply - 1 - plies)
+            else:
+                score = None
+                pending.append(len(scores))
+                children.append(state.detached_copy())
+            state.undo()
+            scores.append(score)
+        # A batch visits many nodes at once, so the periodic clock check in _negamax can skip over it
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if children:
+            for index, value in zip(pending, self.evaluator.evaluate(children)):
+                scores[index] = -float(value) * EVALUATOR_SCALE
+        if not scores:
+            return evaluate(state, self.wall_weight), []
+        best = max(range(len(scores)), key=scores.__getitem__)
+        self.table.store(state.key, 1, score_to_table(scores[best], ply), EXACT, ordered[best])
+        return scores[best], [ordered[best]]
+
+    def candidate_walls(self, state: QuoridorState) -> list[WallAction]:
+        """Applicable walls that touch a cell on one of either pawn's shortest paths"""
+        legal = state.legal_walls()
+        if not legal:
+            return []
+        board = self.board
+        near = 0
+        for agent_index in range(2):
+            near |= board.shortest_path_cells(state.agent_cell(agent_index), board.GOAL_MASKS[agent_index], state.blocked)
+        walls = []
+        for slot, touch in enumerate(board.WALL_TOUCH_MASKS):
+            if touch & near:
+                for orientation in ["h", "v"]:
+                    wall_id = board.wall_id(orientation, slot)
+                    if legal >> wall_id & 1:
+                        walls.append(self.walls_by_id[wall_id])
+        return walls
+
+    def ordered_actions(self, state: QuoridorState, ply: int, first: actions.AnyAction) -> list[actions.AnyAction]:
+        me = state.agent_to_move
+        pawn_moves = [action for action in self.pawn_actions if action.is_applicable(me, state)]
+        # Pawn moves that get closer to the goal come first, then walls, then the remaining pawn moves
+        goal_row = self.board.GOAL_ROWS[me]
+        row = state.agent_cell(me) // self.board.SIZE
+        forward = [action for action in pawn_moves if abs(goal_row - (row + action.agent_delta[1])) < abs(goal_row - row)]
+        sideways = [action for action in pawn_moves if action not in forward]
+        ordered = forward + self.candidate_walls(state) + sideways
+        promoted = [first] + self.killers[ply]
+        for action in reversed(promoted):
+            if action is not None and action in ordered:
+                ordered.remove(action)
+                ordered.insert(0, action)
+        return ordered
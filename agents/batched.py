@@ -0,0 +1,170 @@
+from __future__ import annotations
+import numpy as np
+import domain.board as board
+import domain.movegen as movegen
+import domain.race as race
+from domain.actions import DEFAULT_QUORIDOR_ACTION_LIBRARY
+from domain.state import QuoridorState
+
+NO_WINNER = -1
+# The winner of a race that the race solver shows neither agent can win
+DRAW = 2
+
+PAWN_ACTIONS = [DEFAULT_QUORIDOR_ACTION_LIBRARY[i] for i in movegen.PAWN_ACTION_INDICES]
+WALL_ACTIONS = [DEFAULT_QUORIDOR_ACTION_LIBRARY[i] for i in movegen.WALL_ACTION_INDICES]
+NUM_PAWN_ACTIONS = len(PAWN_ACTIONS)
+
+# Per wall action: its own bit, the bits it conflicts with in each orientation, and the edges it cuts
+WALL_IS_VERTICAL = np.array([action.orientation == "v" for action in WALL_ACTIONS])
+WALL_BIT = np.array([1 << action.slot for action in WALL_ACTIONS], dtype=np.uint64)
+WALL_CONFLICTS_VERTICAL = np.array([board.WALL_CONFLICTS[action.wall_id] >> board.WALL_ID_OFFSET["v"] & ((1 << board.WALL_SLOTS) - 1)
+                                    for action in WALL_ACTIONS], dtype=np.uint64)
+WALL_CONFLICTS_HORIZONTAL = np.array([board.WALL_CONFLICTS[action.wall_id] >> board.WALL_ID_OFFSET["h"]
+                                      for action in WALL_ACTIONS], dtype=np.uint64)
+WALL_CUT_EDGES = np.array([movegen.unpack_bits(action.cut, movegen.EDGE_BYTES) for action in WALL_ACTIONS])
+
+class BatchedPlayouts:
+    """
+    N random playouts held as arrays and advanced one ply at a time for all live games at once.
+    Every live game picks uniformly among its applicable actions, like simulate_games does, and with solve_races
+    it also ends the same way: as soon as both agents are out of walls, with the race solver's result.
+    """
+
+    def __init__(self, states: list[QuoridorState], games_per_state: int, seed: int = None, solve_races: bool = True):
+        count = len(states) * games_per_state
+        self.rng = np.random.default_rng(seed)
+        self.start_index = np.repeat(np.arange(len(states)), games_per_state)
+        self.pawns = np.array([[state.agent_cell(0), state.agent_cell(1)] for state in states], dtype=np.int16)[self.start_index]
+        self.vertical_walls = np.array([state.vertical_walls for state in states], dtype=np.uint64)[self.start_index]
+        self.horizontal_walls = np.array([state.horizontal_walls for state in states], dtype=np.uint64)[self.start_index]
+        self.blocked = np.array([movegen.unpack_bits(state.blocked | 1 << movegen.CLOSED_EDGE, movegen.EDGE_BYTES)
+                                 for state in states])[self.start_index]
+        self.walls_left = np.array([state.walls_left for state in states], dtype=np.int8)[self.start_index]
+        self.agent_to_move = np.array([state.agent_to_move for state in states], dtype=np.int8)[self.start_index]
+        self.winner = np.full(count, NO_WINNER, dtype=np.int8)
+        self.solve_races = solve_races
+        self.plies = 0
+        self._update_winners(np.arange(count))
+        if solve_races:
+            self._solve_races(np.arange(count))
+
+    @property
+    def done(self) -> np.ndarray:
+        return self.winner != NO_WINNER
+
+    def _update_winners(self, games: np.ndarray):
+        rows = self.pawns[games] // board.SIZE
+        self.winner[games[rows[:, 1] == board.GOAL_ROWS[1]]] = 1
+        self.winner[games[rows[:, 0] == board.GOAL_ROWS[0]]] = 0
+
+    def _solve_races(self, games: np.ndarray):
+        """Ends the live games among `games` in which both agents are out of walls, grouped by wall layout"""
+        games = games[~self.done[games] & (self.walls_left[games] == 0).all(axis=1)]
+        if len(games) == 0:
+            return
+        layouts, layout_of_game = np.unique(np.packbits(self.blocked[games], axis=1, bitorder="little"),
+                                            axis=0, return_inverse=True)
+        layout_of_game = layout_of_game.reshape(-1)
+        mover = self.agent_to_move[games].astype(np.int64)
+        index = race.position_index(mover, self.pawns[games, 0].astype(np.int64), self.pawns[games, 1].astype(np.int64))
+        for layout_number, layout in enumerate(layouts):
+            values, _ = race.solve_layout(int.from_bytes(layout.tobytes(), "little") & ~(1 << movegen.CLOSED_EDGE))
+            in_layout = layout_of_game == layout_number
+            value = values[index[in_layout]]
+            self.winner[games[in_layout]] = np.where(value == race.WIN, mover[in_layout],
+                                                     np.where(value == race.LOSS, 1 - mover[in_layout], DRAW))
+
+    def _pawn_mask(self, games: np.ndarray, mover: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        tables = movegen.PAWN_TABLES
+        cell = self.pawns[games, mover]
+        opponent = self.pawns[games, 1 - mover]
+        target = tables["target"][:, cell].T
+        rows = np.arange(len(games))[:, None]
+        blocked = self.blocked[games]
+        occupancy_ok = np.where(tables["is_move"], target != opponent[:, None], tables["midway"][:, cell].T == opponent[:, None])
+        mask = (occupancy_ok
+                & ~blocked[rows, tables["open1"][:, cell].T]
+                & ~blocked[rows, tables["open2"][:, cell].T]
+                & blocked[rows, tables["closed"][:, cell].T])
+        return mask, target
+
+    def _wall_mask(self, games: np.ndarray, mover: np.ndarray) -> np.ndarray:
+        """Walls that fit geometrically; whether they cut an agent off is only checked once one is picked"""
+        conflicts = ((self.vertical_walls[games, None] & WALL_CONFLICTS_VERTICAL)
+                     | (self.horizontal_walls[games, None] & WALL_CONFLICTS_HORIZONTAL))
+        return (conflicts == 0) & (self.walls_left[games, mover] > 0)[:, None]
+
+    def _cuts_off(self, games: np.ndarray, walls: np.ndarray) -> np.ndarray:
+        """Does placing walls[i] in games[i] leave some agent without a path?"""
+        if len(games) == 0:
+            return np.zeros(0, dtype=bool)
+        distances = movegen.goal_distances(self.blocked[games] | WALL_CUT_EDGES[walls], self.pawns[games])
+        return (distances == board.CELLS).any(axis=1)
+
+    def step(self):
+        """Plays one random ply in every game that is not finished yet"""
+        games = np.flatnonzero(~self.done)
+        if len(games) == 0:
+            return
+        mover = self.agent_to_move[games]
+        pawn_mask, pawn_target = self._pawn_mask(games, mover)
+        if self.walls_left[games, mover].any():
+            legal = np.concatenate([pawn_mask, self._wall_mask(games, mover)], axis=1)
+        else:
+            legal = pawn_mask
+        # Uniform choice among the candidates: the largest random key among the legal ones
+        keys = np.where(legal, self.rng.random(legal.shape), -1.0)
+        choice = keys.argmax(axis=1)
+        while True:
+            picked_wall = np.flatnonzero(choice >= NUM_PAWN_ACTIONS)
+            blocking = picked_wall[self._cuts_off(games[picked_wall], choice[picked_wall] - NUM_PAWN_ACTIONS)]
+            if len(blocking) == 0:
+                break
+            keys[blocking, choice[blocking]] = -1.0
+            choice[blocking] = keys[blocking].argmax(axis=1)
+
+        is_pawn = choice < NUM_PAWN_ACTIONS
+        pawn_games = games[is_pawn]
+        self.pawns[pawn_games, mover[is_pawn]] = pawn_target[is_pawn, choice[is_pawn]]
+
+        wall_games = games[~is_pawn]
+        walls = choice[~is_pawn] - NUM_PAWN_ACTIONS
+        vertical = WALL_IS_VERTICAL[walls]
+        self.vertical_walls[wall_games[vertical]] |= WALL_BIT[walls[vertical]]
+        self.horizontal_walls[wall_games[~vertical]] |= WALL_BIT[walls[~vertical]]
+        self.blocked[wall_games] |= WALL_CUT_EDGES[walls]
+        self.walls_left[wall_games, mover[~is_pawn]] -= 1
+
+        self.agent_to_move[games] = 1 - mover
+        self._update_winners(pawn_games)
+        if self.solve_races:
+            # Only a wall can use up the last wall
+            self._solve_races(wall_games)
+        self.plies += 1
+
+    def run(self, max_plies: int = None):
+        """Steps until every game is finished, or until max_plies; unfinished games and drawn races count for nobody"""
+        while not self.done.all() and (max_plies is None or self.plies < max_plies):
+            self.step()
+
+    def win_counts(self, num_states: int) -> np.ndarray:
+        """Array of shape (num_states, 2) with the number of wins of agent 0 and agent 1 per starting state"""
+        counts = np.zeros((num_states, 2), dtype=np.int64)
+        finished = self.done & (self.winner != DRAW)
+        np.add.at(counts, (self.start_index[finished], self.winner[finished]), 1)
+        return counts
+
+
+def batched_win_counts(states: list[QuoridorState], games_per_state: int, seed: int = None,
+                       max_plies: int = None, solve_races: bool = True) -> np.ndarray:
+    """Plays games_per_state random playouts from each state and returns the (num_states, 2) win counts"""
+    playouts = BatchedPlayouts(states, games_per_state, seed, solve_races)
+    playouts.run(max_plies)
+    return playouts.win_counts(len(states))
+
+
+def simulate_games_batched(state: QuoridorState, agent_number: int, num_sims=10000, seed: int = None,
+                           solve_races: bool = True) -> float:
+    """Batched equivalent of simulate_games; agent_number is 1 or 2 as returned by get_winner"""
+    wins = batched_win_counts([state], num_sims, seed, solve_races=solve_races)[0]
+    return wins[agent_number - 1] / num_sims
@@ -0,0 +1,144 @@
+"""
+An opening book: visit counts and results of moves in positions that come up early in every game.
+
+The file is MAGIC, the number of entries, and then fixed-size entries sorted by (position key, action code).
+Position keys are Zobrist keys (QuoridorState.key), which come from a fixed seed and so are the same in
+every process and run; action codes are indices into DEFAULT_QUORIDOR_ACTION_LIBRARY, as in domain.records.
+OpeningBook maps the file and binary searches it, so a lookup is O(log n) and the book is never loaded.
+"""
+from __future__ import annotations
+import mmap
+import os
+import random
+import struct
+from typing import NamedTuple
+import domain.actions as actions
+import domain.records as records
+from domain.state import QuoridorState, initial_state
+from agents.mcts import MCTSAgent, Node
+
+MAGIC = b"QBOOK\x01"
+COUNT = struct.Struct("<I")
+# position key, action code, visits, wins of the agent making the move (draws count one half)
+ENTRY = struct.Struct("<QBId")
+HEADER_SIZE = len(MAGIC) + COUNT.size
+
+
+class BookEntry(NamedTuple):
+    action: actions.AnyAction
+    visits: int
+    wins: float
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.visits if self.visits else 0.0
+
+
+class BookBuilder:
+    """Collects (position, move) statistics in memory and writes them out as a sorted book file"""
+
+    def __init__(self):
+        # (key, action code) -> [visits, wins]
+        self.stats = {}
+
+    def add(self, state: QuoridorState, action: actions.AnyAction, visits: int, wins: float):
+        entry = self.stats.setdefault((state.key, records.encode_action(action)), [0, 0.0])
+        entry[0] += visits
+        entry[1] += wins
+
+    def add_game(self, game_actions: list[actions.AnyAction], winner: int, max_plies: int = 8):
+        """Counts the first max_plies moves of a game from initial_state; winner is 1, 2 or 0 if unfinished"""
+        state = initial_state.detached_copy()
+        for action in game_actions[:max_plies]:
+            mover = state.agent_to_move + 1
+            self.add(state, action, 1, 0.5 if winner == 0 else float(winner == mover))
+            state.apply(action, undoable=False)
+
+    def add_tree(self, node: Node, max_depth: int = 8, min_visits: int = 1):
+        """Counts every edge of an MCTS tree down to max_depth plies that was visited at least min_visits times"""
+        if max_depth == 0:
+            return
+        for child in node.children:
+            if child.visits >= min_visits:
+                self.add(node.state, child.action, child.visits, child.wins)
+                self.add_tree(child, max_depth - 1, min_visits)
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    def write(self, path: str):
+        # Written next to the destination first so that an open book is never overwritten half way
+        with open(path + ".tmp", "wb") as file:
+            file.write(MAGIC)
+            file.write(COUNT.pack(len(self.stats)))
+            for (key, code), (visits, wins) in sorted(self.stats.items()):
+                file.write(ENTRY.pack(key, code, visits, wins))
+        os.replace(path + ".tmp", path)
+
+
+def build_book(path: str, iterations: int = 100000, max_depth: int = 8, min_visits: int = 50, seed: int = 0,
+               verbose: bool = False) -> int:
+    """Searches initial_state with MCTS and writes every well visited line of the tree to a book; returns its size"""
+    agent = MCTSAgent(iterations=iterations, rng=random.Random(seed))
+    root = Node(initial_state.detached_copy())
+    for iteration in range(iterations):
+        agent._iterate(root)
+        if verbose and (iteration + 1) % 10000 == 0:
+            print("%i/%i iterations" % (iteration + 1, iterations))
+    builder = BookBuilder()
+    builder.add_tree(root, max_depth, min_visits)
+    builder.write(path)
+    return len(builder)
+
+
+class OpeningBook:
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("not an opening book file")
+        self.size = COUNT.unpack_from(self.map, len(MAGIC))[0]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _key_at(self, index: int) -> int:
+        return struct.unpack_from("<Q", self.map, HEADER_SIZE + index * ENTRY.size)[0]
+
+    def lookup(self, state: QuoridorState) -> list[BookEntry]:
+        """The book's moves for state, empty if the position is not in the book"""
+        key = state.key
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            entry_key, code, visits, wins = ENTRY.unpack_from(self.map, HEADER_SIZE + low * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append(BookEntry(records.decode_action(code), visits, wins))
+            low += 1
+        return entries
+
+    def best_action(self, state: QuoridorState, min_visits: int = 1) -> actions.AnyAction:
+        """The most visited applicable book move with at least min_visits visits, or None to fall back to search"""
+        entries = [entry for entry in self.lookup(state) if entry.visits >= min_visits and state.is_applicable(entry.action)]
+        if not entries:
+            return None
+        return max(entries, key=lambda entry: entry.visits).action
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> OpeningBook:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,109 @@
+"""
+Batched leaf evaluators for the search agents.
+
+An evaluator is any object with evaluate(states) -> np.ndarray that returns, for every state in the list,
+a value in [-1, 1] for the agent to move in that state: 1 is a sure win, -1 a sure loss. The states are
+turned into arrays once per call, so the per-state Python overhead is paid once per batch rather than once per leaf.
+"""
+from __future__ import annotations
+import abc
+import numpy as np
+import domain.board as board
+import domain.movegen as movegen
+import domain.planes as planes
+from domain.state import QuoridorState
+
+
+def goal_distances(states: list[QuoridorState]) -> np.ndarray:
+    """(len(states), 2) shortest goal distances of both agents, see movegen.goal_distances"""
+    blocked = np.array([movegen.unpack_bits(state.blocked, movegen.EDGE_BYTES) for state in states])
+    return movegen.goal_distances(blocked, np.array([[state.agent_cell(0), state.agent_cell(1)] for state in states]))
+
+
+class Evaluator(abc.ABC):
+    """Base class for evaluators; subclasses implement evaluate"""
+
+    @abc.abstractmethod
+    def evaluate(self, states: list[QuoridorState]) -> np.ndarray:
+        """A value in [-1, 1] for the agent to move in each state; -1 in a finished game, which that agent lost"""
+
+    def __call__(self, states: list[QuoridorState]) -> np.ndarray:
+        return self.evaluate(states)
+
+
+class ShortestPathEvaluator(Evaluator):
+    """
+    The same race heuristic as alphabeta.evaluate, computed for a whole batch and squashed into [-1, 1]:
+    tanh((opponent distance - own distance + wall_weight * wall difference) / temperature).
+    Finished games get their exact value.
+    """
+
+    def __init__(self, wall_weight: float = 1.0, temperature: float = 4.0):
+        self.wall_weight = wall_weight
+        self.temperature = temperature
+
+    def evaluate(self, states: list[QuoridorState]) -> np.ndarray:
+        if not states:
+            return np.zeros(0)
+        distances = goal_distances(states)
+        walls_left = np.array([state.walls_left for state in states], dtype=np.float64)
+        me = np.array([state.agent_to_move for state in states])
+        rows = np.arange(len(states))
+        advantage = (distances[rows, 1 - me] - distances[rows, me]
+                     + self.wall_weight * (walls_left[rows, me] - walls_left[rows, 1 - me]))
+        values = np.tanh(advantage / self.temperature)
+        values[distances[rows, 1 - me] == 0] = -1.0
+        return values
+
+
+class MLPEvaluator(Evaluator):
+    """
+    A small fully connected value network on CPU: the planes of domain.planes, flattened, with the walls-left
+    planes scaled to [0, 1], go through ReLU hidden layers and a tanh output. The weights are kept in a .npz file
+    with arrays w0, b0, w1, b1, ... so that anything that can write NumPy arrays can train one.
+    """
+
+    def __init__(self, weights: list[np.ndarray], biases: list[np.ndarray]):
+        if len(weights) != len(biases) or not weights:
+            raise ValueError("need one bias per weight matrix")
+        if weights[0].shape[0] != np.prod(planes.SHAPE) or weights[-1].shape[1] != 1:
+            raise ValueError("the network must map %i inputs to 1 output" % np.prod(planes.SHAPE))
+        self.weights = [np.asarray(weight, dtype=np.float32) for weight in weights]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in biases]
+
+    @classmethod
+    def load(cls, path: str) -> MLPEvaluator:
+        with np.load(path) as arrays:
+            layers = len([name for name in arrays.files if name.startswith("w")])
+            return cls([arrays["w%i" % i] for i in range(layers)], [arrays["b%i" % i] for i in range(layers)])
+
+    def save(self, path: str):
+        arrays = {}
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays["w%i" % i] = weight
+            arrays["b%i" % i] = bias
+        np.savez(path, **arrays)
+
+    @classmethod
+    def random(cls, hidden: tuple[int, ...] = (128, 64), seed: int = None) -> MLPEvaluator:
+        """An untrained network with He-initialised weights, as a starting point for training"""
+        rng = np.random.default_rng(seed)
+        sizes = [int(np.prod(planes.SHAPE))] + list(hidden) + [1]
+        weights = [rng.normal(0.0, np.sqrt(2.0 / fan_in), (fan_in, fan_out)) for fan_in, fan_out in zip(sizes, sizes[1:])]
+        return cls(weights, [np.zeros(fan_out) for fan_out in sizes[1:]])
+
+    @staticmethod
+    def features(states: list[QuoridorState]) -> np.ndarray:
+        inputs = planes.encode_batch(states).astype(np.float32)
+        inputs[:, list(planes.WALLS_LEFT_PLANES)] /= board.WALLS_PER_PLAYER
+        return inputs.reshape(len(states), -1)
+
+    def evaluate(self, states: list[QuoridorState]) -> np.ndarray:
+        if not states:
+            return np.zeros(0)
+        activations = self.features(states)
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            activations = np.maximum(activations @ weight + bias, 0.0)
+        values = np.tanh(activations @ self.weights[-1] + self.biases[-1])[:, 0].astype(np.float64)
+        values[[state.is_terminal() for state in states]] = -1.0
+        return values
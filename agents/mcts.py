@@ -0,0 +1,207 @@
+from __future__ import annotations
+import math
+import random
+import time
+import domain.actions as actions
+from domain.engine import load as load_engine
+from domain.state import QuoridorState
+
+
+class RolloutTimeout(Exception):
+    pass
+
+
+class Node:
+
+    def __init__(self, state: QuoridorState, parent: Node = None, action: actions.AnyAction = None):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.children = []
+        self.untried_actions = None
+        self.visits = 0
+        # Wins are counted for the agent that made the move into this node
+        self.wins = 0.0
+
+    def is_fully_expanded(self) -> bool:
+        return self.untried_actions is not None and not self.untried_actions
+
+    def uct_child(self, exploration: float) -> Node:
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+    def most_visited_child(self) -> Node:
+        return max(self.children, key=lambda child: child.visits)
+
+
+class MCTSAgent:
+    """
+    UCT Monte Carlo Tree Search with uniformly random rollouts.
+    The search stops after `iterations` iterations or `time_limit` seconds, whichever comes first;
+    either may be None for no limit, but not both.
+    The subtree below the chosen move is kept, so when the opponent's reply is in it the next search starts from there.
+    With an opening book (agents.book.OpeningBook), positions in the book are played from it without searching.
+    With an evaluator (see agents.evaluators), leaves are valued by it instead of by rollouts: up to `batch_size`
+    leaves are selected at once, each path taking a virtual loss so that the selections spread out,
+    and the whole batch is valued with a single evaluate call.
+    `engine` is the domain package of the board it plays on, see domain.engine.load; the standard 9x9 by default.
+    """
+
+    def __init__(self, iterations: int = 1000, time_limit: float = None, exploration: float = math.sqrt(2),
+                 rollout_limit: int = None, rng: random.Random = None, book=None, evaluator=None, batch_size: int = 64,
+                 engine=None):
+        if iterations is None and time_limit is None:
+            raise ValueError("MCTSAgent needs an iteration budget or a time limit")
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rollout_limit = rollout_limit
+        self.rng = rng or random.Random()
+        self.book = book
+        self.evaluator = evaluator
+        self.batch_size = batch_size
+        self.engine = engine if engine is not None else load_engine()
+        self.movegen = self.engine.movegen
+        self.race = self.engine.race
+        self.library = self.engine.DEFAULT_QUORIDOR_ACTION_LIBRARY
+        self.root = None
+        self.last_iterations = 0
+
+    def _find_root(self, state: QuoridorState) -> Node:
+        """Reuses the node for `state` if it is the kept root or one of its children, and drops everything else"""
+        if self.root is not None:
+            if self.root.state == state:
+                return self.root
+            for child in self.root.children:
+                if child.state == state:
+                    child.parent = None
+                    child.action = None
+                    return child
+        return Node(state.detached_copy())
+
+    def get_action(self, state: QuoridorState) -> actions.AnyAction:
+        if self.book is not None:
+            action = self.book.best_action(state)
+            if action is not None:
+                self.root = None
+                self.last_iterations = 0
+                return action
+        if self.race.is_race(state) and not state.is_terminal():
+            # Without walls left the game is solved exactly, so there is nothing to search
+            self.root = None
+            self.last_iterations = 0
+            return self.race.solve(state).action
+        root = self._find_root(state)
+        deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        self.last_iterations = self._search(root, deadline)
+        best = root.most_visited_child()
+        best.parent = None
+        self.root = best
+        return best.action
+
+    def _search(self, root: Node, deadline: float) -> int:
+        """
+        Grows the tree below root until the iteration budget or the deadline runs out; returns the iterations.
+        At least one iteration is made whatever the deadline, so that root has a child to choose.
+        """
+        budget = math.inf if self.iterations is None else self.iterations
+        iterations = 0
+        while iterations < budget and (iterations == 0 or deadline is None or time.perf_counter() < deadline):
+            if self.evaluator is None:
+                self._iterate(root)
+                iterations += 1
+            else:
+                iterations += self._iterate_batch(root, min(self.batch_size, budget - iterations), deadline)
+        return iterations
+
+    def _select(self, root: Node) -> Node:
+        """Selection and expansion: returns the new leaf, or a terminal node, and counts a visit on its path"""
+        node = root
+        node.visits += 1
+        while node.is_fully_expanded() and node.children:
+            node = node.uct_child(self.exploration)
+            node.visits += 1
+        if not node.state.is_terminal():
+            if node.untried_actions is None:
+                node.untried_actions = self.movegen.legal_actions(node.state)
+                self.rng.shuffle(node.untried_actions)
+            action = node.untried_actions.pop()
+            child = Node(node.state.result(action), node, action)
+            node.children.append(child)
+            node = child
+            node.visits += 1
+        return node
+
+    @staticmethod
+    def _backpropagate(node: Node, win_probabilities: tuple[float, float]):
+        """Adds each agent's chance of winning from `node` to the nodes it moved into, up to the root"""
+        while node is not None:
+            node.wins += win_probabilities[1 - node.state.agent_to_move]
+            node = node.parent
+
+    @staticmethod
+    def _win_probabilities(winner: int) -> tuple[float, float]:
+        if winner is None:
+            return 0.5, 0.5
+        return (1.0, 0.0) if winner == 0 else (0.0, 1.0)
+
+    def _exact_win_probabilities(self, state: QuoridorState) -> tuple[float, float]:
+        """The outcome of finished games and pawn races, which need no rollout or evaluation; None for other states"""
+        if state.is_terminal():
+            return self._win_probabilities(state.get_winner() - 1)
+        if self.race.is_race(state):
+            winner = self.race.winner(state)
+            return self._win_probabilities(None if winner is None else winner - 1)
+        return None
+
+    def _iterate(self, root: Node):
+        node = self._select(root)
+        self._backpropagate(node, self._win_probabilities(self.rollout(node.state)))
+
+    def _iterate_batch(self, root: Node, count: int, deadline: float = None) -> int:
+        """
+        Selects up to `count` leaves, fewer if the deadline passes, values them together and returns how many.
+        The visits counted during selection carry no wins until the batch is valued, which is a virtual loss
+        that steers the later selections elsewhere.
+        """
+        pending = []
+        selected = 0
+        while selected < count and (selected == 0 or deadline is None or time.perf_counter() < deadline):
+            selected += 1
+            node = self._select(root)
+            exact = self._exact_win_probabilities(node.state)
+            if exact is not None:
+                self._backpropagate(node, exact)
+            else:
+                pending.append(node)
+        if pending:
+            values = self.evaluator.evaluate([node.state for node in pending])
+            for node, value in zip(pending, values):
+                # The value is for the agent to move at the leaf
+                probability = (float(value) + 1.0) / 2.0
+                if node.state.agent_to_move == 0:
+                    self._backpropagate(node, (probability, 1.0 - probability))
+                else:
+                    self._backpropagate(node, (1.0 - probability, probability))
+        return selected
+
+    def rollout(self, state: QuoridorState, stop_at: float = None):
+        """
+        Plays uniformly random moves and returns the winning agent index, or None if the rollout limit is hit.
+        Once both agents are out of walls the race solver decides the game (None for a drawn race).
+        With stop_at, a time.time() value, RolloutTimeout is raised once it has passed.
+        """
+        state = state.detached_copy()
+        plies = 0
+        while not state.is_terminal():
+            if stop_at is not None and time.time() > stop_at:
+                raise RolloutTimeout()
+            if self.race.is_race(state):
+                winner = self.race.winner(state)
+                return None if winner is None else winner - 1
+            if self.rollout_limit is not None and plies >= self.rollout_limit:
+                return None
+            state.apply(self.library[self.movegen.random_legal_action_id(state, self.rng)], undoable=False)
+            plies += 1
+        return state.get_winner() - 1
@@ -1,18 +1,104 @@
+from __future__ import annotations
+import math
+import os
 import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
 import domain.actions as actions
+import domain.instrumentation as instrumentation
+import domain.movegen as movegen
+import domain.race as race
 
-def simulate_games(state, agent_number, num_sims=10000):
+def count_wins(state, agent_number, num_sims, rng: random.Random = None, verbose=False, solve_races=True) -> int:
+    """
+    Plays num_sims uniformly random games from state and counts how many agent_number (1 or 2) wins.
+    With solve_races, a game stops as soon as both agents are out of walls and the race solver decides it
+    (a drawn race counts as no win); without it every game is played out at random to the end.
+    """
+    rng = rng or random
     agent_wins = 0
     for i in range(num_sims):
-        print(i)
-        current_state = state.copy()
+        if verbose:
+            print(i)
+        current_state = state.detached_copy()
+        winner = None
         while not current_state.is_terminal():
-            print(current_state)
-            app_actions = current_state.get_applicable_actions(actions.DEFAULT_QUORIDOR_ACTION_LIBRARY)
-            action_index = random.randint(0, len(app_actions) - 1)
-            action = app_actions[action_index]
-            current_state = current_state.result(action)
-        winner = current_state.get_winner()
+            if solve_races and race.is_race(current_state):
+                winner = race.winner(current_state)
+                break
+            if verbose:
+                print(current_state)
+            action = actions.DEFAULT_QUORIDOR_ACTION_LIBRARY[movegen.random_legal_action_id(current_state, rng)]
+            current_state.apply(action, undoable=False)
+        if instrumentation.enabled:
+            instrumentation.record_playout(current_state.path_cost - state.path_cost)
+        if current_state.is_terminal():
+            winner = current_state.get_winner()
         if winner == agent_number:
             agent_wins += 1
-    return agent_wins/num_sims
\ No newline at end of file
+    return agent_wins
+
+def simulate_games(state, agent_number, num_sims=10000, rng: random.Random = None, verbose=False, solve_races=True):
+    return count_wins(state, agent_number, num_sims, rng, verbose, solve_races)/num_sims
+
+
+def profile_simulate_games(state, agent_number, num_sims=100, rng: random.Random = None, output: str = None,
+                           sort: str = "cumulative", limit: int = 30):
+    """simulate_games under cProfile, see instrumentation.profile; returns the win rate and the pstats.Stats"""
+    return instrumentation.profile(simulate_games, state, agent_number, num_sims, rng,
+                                   output=output, sort=sort, limit=limit)
+
+
+class SimulationResult(NamedTuple):
+    wins: int
+    num_sims: int
+    win_rate: float
+    confidence_interval: tuple[float, float]
+
+
+def wilson_interval(wins: int, num_sims: int, confidence: float = 0.95) -> tuple[float, float]:
+    """Wilson score interval for a binomial win rate"""
+    if num_sims == 0:
+        return 0.0, 1.0
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = wins / num_sims
+    denominator = 1 + z * z / num_sims
+    centre = (rate + z * z / (2 * num_sims)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / num_sims + z * z / (4 * num_sims * num_sims)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def shard_sizes(num_sims: int, shards: int) -> list[int]:
+    return [num_sims // shards + (1 if i < num_sims % shards else 0) for i in range(shards)]
+
+
+def _simulate_shard(state, agent_number: int, num_sims: int, seed: int, shard: int) -> int:
+    # Every shard gets its own stream, derived only from the seed and the shard number
+    rng = random.Random("%i/%i" % (seed, shard))
+    return count_wins(state, agent_number, num_sims, rng)
+
+
+def simulate_games_parallel(state, agent_number, num_sims=10000, workers: int = None, seed: int = 0,
+                            confidence: float = 0.95, verbose=False) -> SimulationResult:
+    """
+    Runs simulate_games sharded over a process pool, one shard and one seeded random stream per worker.
+    The result only depends on the seed and the number of workers, not on scheduling.
+    """
+    workers = workers or os.cpu_count() or 1
+    sizes = shard_sizes(num_sims, workers)
+    root = state.detached_copy()
+    if workers == 1:
+        wins = [_simulate_shard(root, agent_number, sizes[0], seed, 0)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_simulate_shard, root, agent_number, size, seed, shard)
+                       for shard, size in enumerate(sizes)]
+            wins = []
+            for shard, future in enumerate(futures):
+                wins.append(future.result())
+                if verbose:
+                    print("shard %i: %i/%i wins" % (shard, wins[-1], sizes[shard]))
+    total_wins = sum(wins)
+    return SimulationResult(total_wins, num_sims, total_wins / num_sims if num_sims else 0.0,
+                            wilson_interval(total_wins, num_sims, confidence))
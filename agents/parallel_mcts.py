@@ -0,0 +1,198 @@
+"""
+MCTS spread over worker processes, in two variants.
+
+Root parallelism: every worker grows its own tree from the same position with its own random seed,
+and the root children's visits and wins are summed over the trees to pick the move.
+
+Tree parallelism: the workers share one tree. Python objects cannot be shared between processes, so the tree
+lives in this process, which does selection, expansion and backpropagation, while the workers play the rollouts.
+Up to `in_flight` rollouts per worker are outstanding at once; every path they come from carries a virtual loss
+(its visits are counted at selection time, its wins only when the result comes back), which steers the selections
+that follow onto other paths. Rollouts still running at the deadline give up, and the search waits for them,
+so that the next search starts with idle workers.
+"""
+from __future__ import annotations
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import domain.race as race
+from domain.state import QuoridorState, initial_state
+from domain.records import encode_action, decode_action
+from agents.mcts import MCTSAgent, Node, RolloutTimeout
+
+ROOT = "root"
+TREE = "tree"
+
+
+def warm_up():
+    """
+    Builds the race solver's tables, which take a while and are needed from the first rollout on.
+    Used as the initializer of worker pools, so that no search's clock pays for them.
+    """
+    race.solve_layout(initial_state.blocked)
+
+
+def _ready() -> bool:
+    return True
+
+
+def _root_search(state: QuoridorState, iterations: int, time_limit: float, exploration: float,
+                 rollout_limit: int, seed: int) -> tuple[list[tuple[int, int, float]], int]:
+    """Runs in a worker: one independent search, returned as (action code, visits, wins) per root child"""
+    agent = MCTSAgent(iterations, time_limit, exploration, rollout_limit, random.Random(seed))
+    root = Node(state)
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    done = agent._search(root, deadline)
+    return [(encode_action(child.action), child.visits, child.wins) for child in root.children], done
+
+
+def _rollout(state: QuoridorState, rollout_limit: int, seed: int, stop_at: float):
+    """Runs in a worker: the winner of one random rollout, see MCTSAgent.rollout"""
+    return MCTSAgent(rollout_limit=rollout_limit, rng=random.Random(seed)).rollout(state, stop_at)
+
+
+class ParallelMCTSAgent(MCTSAgent):
+    """
+    MCTSAgent with its rollouts spread over `workers` processes, by root or tree parallelism (mode ROOT or TREE).
+    `iterations` is the budget summed over all workers. The process pool is started by start(), or else on the
+    first move, whose time limit then pays for it, and is kept until close() is called.
+    """
+
+    def __init__(self, workers: int = 2, mode: str = ROOT, iterations: int = 1000, time_limit: float = None,
+                 exploration: float = math.sqrt(2), rollout_limit: int = None, rng: random.Random = None, book=None,
+                 in_flight: int = 2):
+        if mode not in (ROOT, TREE):
+            raise ValueError("mode must be %r or %r, got %r" % (ROOT, TREE, mode))
+        super().__init__(iterations, time_limit, exploration, rollout_limit, rng, book)
+        self.workers = workers
+        self.mode = mode
+        self.in_flight = in_flight
+        self.pool = None
+
+    def start(self):
+        """Starts the worker processes and waits for them to come up"""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+            for future in [self.pool.submit(_ready) for _ in range(self.workers)]:
+                future.result()
+
+    def _search(self, root: Node, deadline: float) -> int:
+        self.start()
+        if self.mode == ROOT:
+            return self._root_parallel_search(root, deadline)
+        return self._tree_parallel_search(root, deadline)
+
+    def _root_parallel_search(self, root: Node, deadline: float) -> int:
+        # The workers' trees are merged into fresh root children, so nothing is kept from an earlier search
+        root.children = []
+        root.untried_actions = []
+        time_limit = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        if self.iterations is None:
+            shares = [None] * self.workers
+        else:
+            shares = [self.iterations // self.workers + (worker < self.iterations % self.workers)
+                      for worker in range(self.workers)]
+        # Detached, so that the states leading up to the root are not pickled along with it
+        state = root.state.detached_copy()
+        futures = [self.pool.submit(_root_search, state, share, time_limit, self.exploration,
+                                    self.rollout_limit, self.rng.getrandbits(64))
+                   for share in shares if share is None or share > 0]
+        # Every worker makes at least one iteration (see MCTSAgent._search), so the merged root always has children
+        merged = {}
+        iterations = 0
+        for future in futures:
+            children, done = future.result()
+            iterations += done
+            for code, visits, wins in children:
+                total = merged.setdefault(code, [0, 0.0])
+                total[0] += visits
+                total[1] += wins
+        for code, (visits, wins) in merged.items():
+            action = decode_action(code)
+            child = Node(root.state.result(action), root, action)
+            child.visits = visits
+            child.wins = wins
+            root.children.append(child)
+        root.visits += iterations
+        return iterations
+
+    def _tree_parallel_search(self, root: Node, deadline: float) -> int:
+        # The workers get the deadline on the wall clock, since perf_counter values need not agree across processes
+        stop_at = None if deadline is None else time.time() + (deadline - time.perf_counter())
+        budget = math.inf if self.iterations is None else self.iterations
+        pending = {}
+        started = 0
+        completed = 0
+        while True:
+            while started < budget and len(pending) < self.workers * self.in_flight:
+                # Leaves in pawn races are solved right here, which can take a while for a new wall layout
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                node = self._select(root)
+                started += 1
+                exact = self._exact_win_probabilities(node.state)
+                if exact is not None:
+                    self._backpropagate(node, exact)
+                    completed += 1
+                    continue
+                future = self.pool.submit(_rollout, node.state.detached_copy(), self.rollout_limit,
+                                          self.rng.getrandbits(64), stop_at)
+                pending[future] = node
+            if not pending or (deadline is not None and time.perf_counter() >= deadline):
+                break
+            timeout = None if deadline is None else deadline - time.perf_counter()
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                completed += self._collect(pending.pop(future), future)
+        # Rollouts that have started cannot be cancelled, but they give up at stop_at within a move or so
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        for future, node in pending.items():
+            completed += self._collect(node, future)
+        if not completed:
+            # Out of time before any rollout came back: one iteration is played here to have a move
+            self._iterate(root)
+            completed += 1
+        return completed
+
+    def _collect(self, leaf: Node, future) -> int:
+        """Backpropagates a finished rollout and returns 1, or abandons the leaf of one that gave up and returns 0"""
+        if not future.cancelled():
+            try:
+                winner = future.result()
+            except RolloutTimeout:
+                pass
+            else:
+                self._backpropagate(leaf, self._win_probabilities(winner))
+                return 1
+        self._abandon(leaf)
+        return 0
+
+    @staticmethod
+    def _abandon(leaf: Node):
+        """
+        Removes the visits counted for a leaf whose rollout never came back. Nodes left without visits, the leaf
+        and any pending leaves above it that later selections went on through, leave the tree again.
+        """
+        node = leaf
+        while node is not None:
+            node.visits -= 1
+            node = node.parent
+        node = leaf
+        while node.parent is not None and node.visits == 0 and not node.children:
+            node.parent.children.remove(node)
+            node.parent.untried_actions.append(node.action)
+            node = node.parent
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self) -> ParallelMCTSAgent:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,196 @@
+"""
+Self-play training data, written to append-only shards of memory-mapped .npy files.
+
+A shard is a pair of files in the output directory:
+    shard-00000.planes.npy    uint8 (shard_size, *planes.SHAPE), see domain.planes
+    shard-00000.outcomes.npy  int8 (shard_size,): +1 if agent 0 went on to win, -1 if agent 1 did, 0 if unfinished
+and index.json records how many positions each shard holds, since the last shard is usually not full.
+Generating and reading both go through numpy.memmap, so the dataset never has to fit in memory.
+"""
+from __future__ import annotations
+import json
+import multiprocessing
+import os
+import queue as queues
+import random
+import traceback
+import numpy as np
+import domain.actions as actions
+import domain.movegen as movegen
+import domain.planes as planes
+from domain.state import initial_state
+
+INDEX_FILE = "index.json"
+# How long generate_selfplay waits on the queue before it checks whether a worker has died without a word
+POLL_SECONDS = 5.0
+
+
+def _shard_paths(directory: str, shard: int) -> tuple[str, str]:
+    prefix = os.path.join(directory, "shard-%05i" % shard)
+    return prefix + ".planes.npy", prefix + ".outcomes.npy"
+
+
+def play_game(rng: random.Random, agent=None, max_plies: int = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Plays one game from initial_state, with uniformly random moves or with `agent` on both sides,
+    and returns the planes of every position before the last and each position's outcome for agent 0.
+    """
+    state = initial_state.detached_copy()
+    game_planes = []
+    while not state.is_terminal() and (max_plies is None or len(game_planes) < max_plies):
+        game_planes.append(planes.encode(state))
+        if agent is None:
+            action = actions.DEFAULT_QUORIDOR_ACTION_LIBRARY[movegen.random_legal_action_id(state, rng)]
+        else:
+            action = agent.get_action(state)
+        state.apply(action, undoable=False)
+    outcome = 0
+    if state.is_terminal():
+        outcome = 1 if state.get_winner() == 1 else -1
+    return np.array(game_planes, dtype=np.uint8).reshape((-1,) + planes.SHAPE), np.full(len(game_planes), outcome,
+                                                                                         dtype=np.int8)
+
+
+class ShardWriter:
+    """Appends positions to the shards in a directory, starting a new shard whenever the current one is full"""
+
+    def __init__(self, directory: str, shard_size: int = 1 << 16):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.counts = read_index(directory)
+        self.planes = self.outcomes = None
+        self.positions_written = 0
+
+    def _open_shard(self):
+        if self.planes is None and self.counts:
+            # Carry on filling the last shard of an earlier run
+            planes_path, outcomes_path = _shard_paths(self.directory, len(self.counts) - 1)
+            self.planes = np.lib.format.open_memmap(planes_path, mode="r+")
+            self.outcomes = np.lib.format.open_memmap(outcomes_path, mode="r+")
+            if self.counts[-1] < len(self.outcomes):
+                return
+        self.close_shard()
+        planes_path, outcomes_path = _shard_paths(self.directory, len(self.counts))
+        self.planes = np.lib.format.open_memmap(planes_path, mode="w+", dtype=np.uint8,
+                                                shape=(self.shard_size,) + planes.SHAPE)
+        self.outcomes = np.lib.format.open_memmap(outcomes_path, mode="w+", dtype=np.int8, shape=(self.shard_size,))
+        self.counts.append(0)
+
+    def write(self, game_planes: np.ndarray, outcomes: np.ndarray):
+        start = 0
+        while start < len(outcomes):
+            if self.planes is None or self.counts[-1] == len(self.outcomes):
+                self._open_shard()
+            count = self.counts[-1]
+            size = min(len(self.outcomes) - count, len(outcomes) - start)
+            self.planes[count:count + size] = game_planes[start:start + size]
+            self.outcomes[count:count + size] = outcomes[start:start + size]
+            self.counts[-1] += size
+            start += size
+        self.positions_written += len(outcomes)
+
+    def close_shard(self):
+        if self.planes is not None:
+            self.planes.flush()
+            self.outcomes.flush()
+            self.planes = self.outcomes = None
+        self._write_index()
+
+    def _write_index(self):
+        # Written to a temporary file first so that a reader never sees half an index
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"shape": list(planes.SHAPE), "counts": self.counts}, file)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        self.close_shard()
+
+    def __enter__(self) -> ShardWriter:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_index(directory: str) -> list[int]:
+    """Number of positions in each shard of the directory, [] if there are none yet"""
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)["counts"]
+
+
+def read_shards(directory: str):
+    """Yields read-only memory-mapped (planes, outcomes) arrays for each shard, cut to the positions it holds"""
+    for shard, count in enumerate(read_index(directory)):
+        planes_path, outcomes_path = _shard_paths(directory, shard)
+        yield (np.load(planes_path, mmap_mode="r")[:count], np.load(outcomes_path, mmap_mode="r")[:count])
+
+
+def _worker(queue, num_games: int, seed: int, worker: int, agent_factory, max_plies: int):
+    # Ends with None when every game is played, or with the traceback as a string when one fails
+    error = None
+    try:
+        # Every worker gets its own stream, derived only from the seed and the worker number
+        rng = random.Random("%i/%i" % (seed, worker))
+        agent = agent_factory() if agent_factory is not None else None
+        for _ in range(num_games):
+            queue.put(play_game(rng, agent, max_plies))
+    except BaseException:
+        error = traceback.format_exc()
+        raise
+    finally:
+        queue.put(error)
+
+
+def generate_selfplay(directory: str, num_games: int, workers: int = None, seed: int = 0, agent_factory=None,
+                      shard_size: int = 1 << 16, queue_size: int = 64, max_plies: int = None,
+                      verbose: bool = False) -> int:
+    """
+    Plays num_games games over `workers` processes and appends every position to the shards in directory.
+    Games use uniformly random moves unless agent_factory (a picklable callable returning an agent) is given.
+    Workers hand finished games to this process through a queue of at most queue_size games, so writing to
+    disk overlaps with playing, and workers wait instead of piling games up in memory when the disk falls behind.
+    Returns the number of positions written. If a worker fails, the others are stopped and RuntimeError is raised;
+    the games written until then stay in the shards.
+    """
+    workers = workers or os.cpu_count() or 1
+    games_per_worker = [num_games // workers + (1 if i < num_games % workers else 0) for i in range(workers)]
+    queue = multiprocessing.Queue(queue_size)
+    processes = [multiprocessing.Process(target=_worker, args=(queue, games, seed, worker, agent_factory, max_plies),
+                                         daemon=True)
+                 for worker, games in enumerate(games_per_worker)]
+    for process in processes:
+        process.start()
+    games_written = 0
+    try:
+        with ShardWriter(directory, shard_size) as writer:
+            running = len(processes)
+            while running:
+                try:
+                    game = queue.get(timeout=POLL_SECONDS)
+                except queues.Empty:
+                    # A worker that is killed (out of memory, say) never gets to send anything
+                    for worker, process in enumerate(processes):
+                        if process.exitcode not in (None, 0):
+                            raise RuntimeError("self-play worker %i died with exit code %i"
+                                               % (worker, process.exitcode))
+                    continue
+                if game is None:
+                    running -= 1
+                    continue
+                if isinstance(game, str):
+                    raise RuntimeError("a self-play worker failed:\n" + game)
+                writer.write(*game)
+                games_written += 1
+                if verbose and games_written % 100 == 0:
+                    print("%i/%i games, %i positions" % (games_written, num_games, writer.positions_written))
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+    return writer.positions_written
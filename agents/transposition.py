@@ -0,0 +1,61 @@
+from __future__ import annotations
+from typing import Any, NamedTuple
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class Entry(NamedTuple):
+    key: int
+    depth: int
+    value: float
+    flag: int
+    best_action: Any
+    age: int
+
+
+class TranspositionTable:
+    """
+    A fixed-size table of search results indexed by Zobrist key (QuoridorState.key).
+    Each key maps to a bucket of two slots: a depth-preferred slot that only gives way to a deeper
+    search or to an entry left over from an older search, and an always-replace slot for everything else.
+    Call new_search() before each root search so that stale entries age out.
+    """
+
+    def __init__(self, size: int = 1 << 20):
+        self.buckets = 1 << max(0, (size // 2 - 1).bit_length())
+        self.mask = self.buckets - 1
+        self.slots = [None] * (2 * self.buckets)
+        self.age = 0
+        self.hits = 0
+        self.probes = 0
+
+    def new_search(self):
+        self.age += 1
+
+    def probe(self, key: int) -> Entry:
+        self.probes += 1
+        index = 2 * (key & self.mask)
+        for entry in (self.slots[index], self.slots[index + 1]):
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+        return None
+
+    def store(self, key: int, depth: int, value: float, flag: int = EXACT, best_action: Any = None):
+        index = 2 * (key & self.mask)
+        entry = Entry(key, depth, value, flag, best_action, self.age)
+        preferred = self.slots[index]
+        if preferred is None or preferred.key == key or preferred.age != self.age or depth >= preferred.depth:
+            self.slots[index] = entry
+        else:
+            self.slots[index + 1] = entry
+
+    def clear(self):
+        self.slots = [None] * (2 * self.buckets)
+        self.hits = 0
+        self.probes = 0
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self.slots if entry is not None)
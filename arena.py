@@ -0,0 +1,221 @@
+"""
+Runs matches between the built-in agents and rates them.
+
+Round robin plays every pair of agents, a gauntlet plays the first agent against each of the others.
+Each pairing is played `games` times with the agents alternating who starts from initial_state. The games run
+in a process pool and every move is made under a time limit: an agent that goes over it by more than the grace
+period loses on time. A game that reaches the ply cap is a draw.
+
+The report gives Elo ratings with 95% error bars, each agent's search speed (MCTS iterations or alpha-beta
+nodes per second) and move time percentiles. Every game is appended to a domain.records file for replaying.
+
+    python arena.py mcts alphabeta mcts-sp --games 50 --move-time 0.2 --output arena.qrec
+    python arena.py alphabeta-sp alphabeta mcts --mode gauntlet --games 200
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from domain import *
+from domain.records import RecordWriter, encode_action, decode_action
+from agents import AGENTS
+from agents.parallel_mcts import warm_up
+
+MAX_PLIES = 200
+# Time an agent may go over the move time limit before it loses on time, for the clock checks inside the searches
+TIME_GRACE = 0.1
+ELO_SCALE = 400 / math.log(10)
+
+
+def search_nodes(agent) -> int:
+    """Nodes searched for the last move: alpha-beta nodes or MCTS iterations"""
+    if hasattr(agent, "last_nodes"):
+        return agent.last_nodes
+    return getattr(agent, "last_iterations", 0)
+
+
+def play_game(game_index: int, names: tuple[str, str], move_time: float, max_plies: int, seed: int) -> dict:
+    """
+    Plays one game in a worker process. names[0] moves first. Returns the action codes, the winner (1 or 2 for
+    names[0] or names[1], 0 for a draw), the reason the game ended and each agent's move times and nodes.
+    """
+    rng = random.Random("%i/%i" % (seed, game_index))
+    result = play_agents([AGENTS[name](move_time, rng) for name in names], move_time, max_plies)
+    result.update({"game": game_index, "agents": list(names)})
+    return result
+
+
+def play_agents(agents: list, move_time: float, max_plies: int = MAX_PLIES) -> dict:
+    """Plays one game between two agent objects, agents[0] first, and returns the same fields as play_game"""
+    state = initial_state.detached_copy()
+    moves = []
+    times = [[], []]
+    nodes = [0, 0]
+    winner, reason = 0, "plies"
+    while len(moves) < max_plies:
+        if state.is_terminal():
+            winner, reason = state.get_winner(), "goal"
+            break
+        me = state.agent_to_move
+        started = time.perf_counter()
+        action = agents[me].get_action(state)
+        elapsed = time.perf_counter() - started
+        times[me].append(elapsed)
+        nodes[me] += search_nodes(agents[me])
+        if elapsed > move_time + TIME_GRACE:
+            winner, reason = 2 - me, "timeout"
+            break
+        if not state.is_applicable(action):
+            winner, reason = 2 - me, "illegal"
+            break
+        state.apply(action, undoable=False)
+        moves.append(encode_action(action))
+    else:
+        if state.is_terminal():
+            winner, reason = state.get_winner(), "goal"
+    return {"moves": moves, "winner": winner, "reason": reason, "times": times, "nodes": nodes}
+
+
+def round_robin(names: list[str], games: int) -> list[tuple[str, str]]:
+    """Every pair plays `games` games, taking turns to start"""
+    return [pair if game % 2 == 0 else pair[::-1] for pair in itertools.combinations(names, 2) for game in range(games)]
+
+
+def gauntlet(names: list[str], games: int) -> list[tuple[str, str]]:
+    """names[0] plays `games` games against each of the others, taking turns to start"""
+    return [(names[0], other) if game % 2 == 0 else (other, names[0]) for other in names[1:] for game in range(games)]
+
+
+def elo_ratings(names: list[str], results: list[dict], iterations: int = 1000) -> dict[str, tuple[float, float]]:
+    """
+    Maximum likelihood (Bradley-Terry) Elo ratings with a 95% error bar each, anchored so that the mean is 0.
+    Draws count half a win for each side. Every pair gets one virtual draw so that unbeaten agents get a finite rating.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    count = len(names)
+    score = [[0.0] * count for _ in range(count)]
+    played = [[0.0] * count for _ in range(count)]
+    for i in range(count):
+        for j in range(count):
+            if i != j:
+                score[i][j], played[i][j] = 0.5, 1.0
+    for result in results:
+        first, second = index[result["agents"][0]], index[result["agents"][1]]
+        played[first][second] += 1
+        played[second][first] += 1
+        points = {0: 0.5, 1: 1.0, 2: 0.0}[result["winner"]]
+        score[first][second] += points
+        score[second][first] += 1 - points
+
+    # Minorisation-maximisation updates of the strengths, see Hunter (2004)
+    strengths = [1.0] * count
+    for _ in range(iterations):
+        updated = []
+        for i in range(count):
+            wins = sum(score[i])
+            denominator = sum(played[i][j] / (strengths[i] + strengths[j]) for j in range(count) if j != i)
+            updated.append(wins / denominator if denominator else strengths[i])
+        geometric_mean = math.exp(sum(math.log(strength) for strength in updated) / count)
+        updated = [strength / geometric_mean for strength in updated]
+        converged = max(abs(a - b) for a, b in zip(updated, strengths)) < 1e-10
+        strengths = updated
+        if converged:
+            break
+
+    ratings = {}
+    for name, i in index.items():
+        # Standard error from the diagonal of the Fisher information
+        information = sum(played[i][j] * strengths[i] * strengths[j] / (strengths[i] + strengths[j]) ** 2
+                          for j in range(count) if j != i)
+        error = 1.96 * ELO_SCALE / math.sqrt(information) if information else float("inf")
+        ratings[name] = (ELO_SCALE * math.log(strengths[i]), error)
+    return ratings
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    # quantiles needs two values at least
+    cuts = statistics.quantiles(values * 2 if len(values) == 1 else values, n=100, method="inclusive")
+    return {"p50": 1000 * cuts[49], "p90": 1000 * cuts[89], "p99": 1000 * cuts[98], "max": 1000 * max(values)}
+
+
+def report(names: list[str], results: list[dict]) -> dict:
+    ratings = elo_ratings(names, results)
+    agents = {}
+    for name in names:
+        times, nodes, score, games = [], 0, 0.0, 0
+        for result in results:
+            for side in range(2):
+                if result["agents"][side] == name:
+                    times += result["times"][side]
+                    nodes += result["nodes"][side]
+                    games += 1
+                    score += 0.5 if result["winner"] == 0 else float(result["winner"] == side + 1)
+        thinking = sum(times)
+        agents[name] = {"elo": round(ratings[name][0], 1), "elo_error": round(ratings[name][1], 1),
+                        "games": games, "score": score, "moves": len(times),
+                        "nodes_per_second": round(nodes / thinking) if thinking else 0,
+                        "move_time_ms": {key: round(value, 2) for key, value in percentiles(times).items()}}
+    reasons = {}
+    for result in results:
+        reasons[result["reason"]] = reasons.get(result["reason"], 0) + 1
+    return {"games": len(results), "endings": reasons, "agents": agents}
+
+
+def run_arena(names: list[str], games: int, mode: str = "round-robin", move_time: float = 0.2,
+              workers: int = None, output: str = None, max_plies: int = MAX_PLIES, seed: int = 0,
+              verbose: bool = False) -> dict:
+    """Plays the matches and returns the report; with `output`, every game is appended to that record file"""
+    unknown = [name for name in names if name not in AGENTS]
+    if unknown or len(names) < 2:
+        raise ValueError("need at least two agents out of %s, got %s" % (", ".join(AGENTS), ", ".join(names)))
+    pairings = (round_robin if mode == "round-robin" else gauntlet)(names, games)
+    writer = RecordWriter(output) if output else None
+    results = []
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=warm_up) as pool:
+            futures = [pool.submit(play_game, game_index, pair, move_time, max_plies, seed)
+                       for game_index, pair in enumerate(pairings)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if writer is not None:
+                    writer.write_actions([decode_action(code) for code in result["moves"]], result["winner"],
+                                         {"agents": result["agents"], "reason": result["reason"],
+                                          "move_time": move_time, "game": result["game"]})
+                if verbose:
+                    print("%i/%i %s vs %s: %s (%s, %i plies)" % (
+                        len(results), len(pairings), result["agents"][0], result["agents"][1],
+                        "draw" if result["winner"] == 0 else result["agents"][result["winner"] - 1] + " wins",
+                        result["reason"], len(result["moves"])))
+    finally:
+        if writer is not None:
+            writer.close()
+    summary = report(names, sorted(results, key=lambda result: result["game"]))
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays matches between agents and reports Elo ratings")
+    parser.add_argument("agents", nargs="+", help="agents to play, out of: %s" % ", ".join(AGENTS))
+    parser.add_argument("--mode", choices=["round-robin", "gauntlet"], default="round-robin",
+                        help="gauntlet plays the first agent against each of the others")
+    parser.add_argument("--games", type=int, default=10, help="games per pairing")
+    parser.add_argument("--move-time", type=float, default=0.2, help="time limit per move, in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="games this long are drawn")
+    parser.add_argument("--output", default=None, help="record file the games are appended to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(run_arena(args.agents, args.games, args.mode, args.move_time, args.workers, args.output,
+                               args.max_plies, args.seed, not args.quiet), indent=2))
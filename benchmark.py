@@ -0,0 +1,291 @@
+"""
+Benchmarks for the game engine.
+
+    python benchmark.py                          run everything and print the results as JSON
+    python benchmark.py --output results.json    also save them
+    python benchmark.py --baseline results.json  compare against saved results, exit with 1 on a regression
+    python benchmark.py --sizes 5 7 9 11 13      also measure how the engine and the searches scale with the board size
+
+Perft node counts must match the baseline exactly, since they only change when the rules do.
+Throughput (calls or playouts per second) counts as a regression when it drops by more than --threshold,
+and timings (seconds, such as the start-up cost of `import domain`) when they grow by more than it.
+"""
+from __future__ import annotations
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from domain import *
+import domain.engine as engine
+import domain.board as board
+import domain.walls as walls
+from agents.montecarlo import count_wins
+from agents.mcts import MCTSAgent
+from agents.alphabeta import AlphaBetaAgent
+
+# Fixed mid-game positions with many walls on the board: (agent positions, wall positions, agent to move, walls left)
+MIDGAME_POSITIONS = {
+    "midgame-12-walls": ([((4, 0), "1"), ((2, 6), "2")],
+                         [((0, 5), "v"), ((1, 0), "h"), ((3, 1), "v"), ((3, 2), "h"), ((4, 0), "v"), ((4, 7), "h"),
+                          ((5, 0), "v"), ((5, 3), "h"), ((6, 0), "v"), ((6, 2), "v"), ((7, 3), "v"), ((7, 6), "v")],
+                         0, (4, 4)),
+    "midgame-16-walls": ([((7, 1), "1"), ((3, 8), "2")],
+                         [((0, 6), "h"), ((1, 0), "v"), ((2, 1), "h"), ((2, 2), "h"), ((3, 0), "h"), ((3, 3), "v"),
+                          ((3, 5), "v"), ((4, 1), "v"), ((4, 2), "h"), ((4, 5), "v"), ((4, 6), "h"), ((5, 3), "h"),
+                          ((6, 0), "v"), ((6, 4), "v"), ((6, 5), "h"), ((7, 3), "h")],
+                         1, (0, 4)),
+    "midgame-19-walls": ([((5, 2), "1"), ((2, 8), "2")],
+                         [((0, 2), "v"), ((1, 3), "h"), ((1, 5), "h"), ((1, 7), "v"), ((2, 2), "h"), ((3, 0), "v"),
+                          ((3, 3), "h"), ((3, 5), "h"), ((3, 7), "v"), ((4, 5), "v"), ((4, 7), "v"), ((5, 1), "h"),
+                          ((5, 3), "v"), ((5, 6), "v"), ((6, 0), "v"), ((6, 7), "h"), ((7, 0), "v"), ((7, 2), "v"),
+                          ((7, 4), "v")],
+                         1, (0, 1)),
+}
+
+PERFT_DEPTHS = {"initial": 2, "midgame-12-walls": 2, "midgame-16-walls": 2, "midgame-19-walls": 3}
+
+
+def cold_copy(state: QuoridorState, walls_module=walls) -> QuoridorState:
+    """A fresh copy of state, with walls._cut_analysis (cached by wall layout) emptied too, so wall legality is timed cold"""
+    walls_module._cut_analysis.cache_clear()
+    return state.detached_copy()
+
+
+def benchmark_positions() -> dict[str, QuoridorState]:
+    positions = {"initial": initial_state}
+    for name, (agent_positions, wall_positions, agent_to_move, walls_left) in MIDGAME_POSITIONS.items():
+        positions[name] = QuoridorState.from_positions(agent_positions, wall_positions, agent_to_move, walls_left)
+    return positions
+
+
+def perft(state: QuoridorState, depth: int, library: list = DEFAULT_QUORIDOR_ACTION_LIBRARY) -> int:
+    """Number of leaf positions `depth` plies below state; finished games count as leaves"""
+    if depth == 0 or state.is_terminal():
+        return 1
+    nodes = 0
+    for action in state.get_applicable_actions(library):
+        state.apply(action)
+        nodes += perft(state, depth - 1, library)
+        state.undo()
+    return nodes
+
+
+def sample_states(count: int, seed: int = 0, package=None) -> list[QuoridorState]:
+    """
+    Positions taken from seeded random games, so that every run measures the same mix of boards.
+    package is the engine to play with, see domain.engine.load; the standard one by default.
+    """
+    package = package or engine.load()
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        state = package.initial_state.detached_copy()
+        while not state.is_terminal() and len(states) < count:
+            if rng.random() < 0.1:
+                states.append(state.detached_copy())
+            state.apply(package.DEFAULT_QUORIDOR_ACTION_LIBRARY[package.movegen.random_legal_action_id(state, rng)],
+                        undoable=False)
+    return states
+
+
+def rate(function, min_time: float) -> float:
+    """Calls per second of function(), which performs `calls` operations and returns that count"""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        calls += function()
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def import_time(module: str = "domain", runs: int = 10) -> float:
+    """Best of `runs` fresh interpreters at importing module, in seconds"""
+    code = "import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)" % module
+    return min(float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+               for _ in range(runs))
+
+
+def run_benchmarks(min_time: float = 1.0, playouts: int = 20) -> dict:
+    positions = benchmark_positions()
+    results = {"perft": {}, "rates": {}, "timings": {"import domain": import_time("domain")}}
+    for name, state in positions.items():
+        depth = PERFT_DEPTHS[name]
+        start = time.perf_counter()
+        nodes = perft(state.detached_copy(), depth)
+        elapsed = time.perf_counter() - start
+        results["perft"]["%s/%i" % (name, depth)] = nodes
+        results["rates"]["perft %s/%i nodes" % (name, depth)] = nodes / elapsed
+
+    states = sample_states(200) + list(positions.values())
+
+    def get_applicable_actions():
+        for state in states:
+            state.detached_copy().get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY)
+        return len(states)
+
+    wall_queries = [(state, action.position, action.orientation)
+                    for state in states for action in WALL_ACTIONS[::16]]
+
+    def wall_blocks():
+        for state, position, orientation in wall_queries:
+            cold_copy(state).wall_blocks(position, orientation)
+        return len(wall_queries)
+
+    transitions = [(state, action) for state in states
+                   for action in state.get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY)[::8]]
+
+    def result():
+        for state, action in transitions:
+            state.result(action)
+        return len(transitions)
+
+    rng = random.Random(0)
+
+    def playouts_per_second():
+        count_wins(initial_state, 1, playouts, rng)
+        return playouts
+
+    results["rates"]["get_applicable_actions"] = rate(get_applicable_actions, min_time)
+    results["rates"]["wall_blocks"] = rate(wall_blocks, min_time)
+    results["rates"]["result"] = rate(result, min_time)
+    results["rates"]["random playouts"] = rate(playouts_per_second, min_time)
+    results["python"] = platform.python_version()
+    return results
+
+
+def scaled_walls(size: int) -> int:
+    """Walls per player that keep the standard game's ratio of walls to board width"""
+    return round(board.DEFAULT_WALLS_PER_PLAYER * (size - 1) / (board.DEFAULT_SIZE - 1))
+
+
+def search_rates(package, states: list[QuoridorState], count: int, search_time: float) -> dict:
+    """
+    MCTS iterations and alpha-beta nodes per second, and the depth alpha-beta completes, searching `count` of
+    the states for search_time seconds each. Only states with walls left are searched, since the race solver
+    answers for the others.
+    """
+    states = [state for state in states if not state.is_terminal() and not package.race.is_race(state)]
+    states = states[::max(1, len(states) // count)][:count]
+    iterations = nodes = depths = 0
+    mcts_time = alphabeta_time = 0.0
+    for state in states:
+        mcts = MCTSAgent(None, search_time, rng=random.Random(0), engine=package)
+        start = time.perf_counter()
+        mcts.get_action(state)
+        mcts_time += time.perf_counter() - start
+        iterations += mcts.last_iterations
+        alphabeta = AlphaBetaAgent(search_time, engine=package)
+        start = time.perf_counter()
+        alphabeta.get_action(state)
+        alphabeta_time += time.perf_counter() - start
+        nodes += alphabeta.last_nodes
+        depths += alphabeta.last_depth
+    return {"mcts iterations per second": iterations / mcts_time,
+            "alphabeta nodes per second": nodes / alphabeta_time,
+            "alphabeta depth": depths / len(states)}
+
+
+def scaling_benchmarks(sizes: list[int], min_time: float = 1.0, playouts: int = 20, search_positions: int = 5,
+                       search_time: float = 0.5) -> dict:
+    """
+    For each board size, with scaled_walls(size) walls each: the cost of building the engine's tables,
+    the branching factor, perft from the initial position, the rates of move generation, wall legality checks
+    and random playouts, and the search speed of MCTS and alpha-beta on search_positions sampled positions.
+    """
+    results = {}
+    for size in sizes:
+        walls_per_player = scaled_walls(size)
+        start = time.perf_counter()
+        package = engine.load(size, walls_per_player)
+        build_time = time.perf_counter() - start
+        library = package.DEFAULT_QUORIDOR_ACTION_LIBRARY
+        legal_action_indices = package.movegen.legal_action_indices
+        states = sample_states(200, package=package)
+
+        start = time.perf_counter()
+        perft_nodes = perft(package.initial_state.detached_copy(), 2, library)
+        perft_rate = perft_nodes / (time.perf_counter() - start)
+
+        def legal_actions():
+            for state in states:
+                legal_action_indices(state.detached_copy())
+            return len(states)
+
+        def legal_walls():
+            for state in states:
+                cold_copy(state, package.walls).legal_walls()
+            return len(states)
+
+        rng = random.Random(0)
+        plies = []
+
+        def playouts_per_second():
+            for _ in range(playouts):
+                state = package.initial_state.detached_copy()
+                while not state.is_terminal():
+                    state.apply(library[package.movegen.random_legal_action_id(state, rng)], undoable=False)
+                plies.append(state.path_cost)
+            return playouts
+
+        results["%ix%i" % (size, size)] = {
+            "walls per player": walls_per_player,
+            "actions": len(library),
+            "engine build seconds": build_time,
+            "branching factor": sum(len(legal_action_indices(state)) for state in states) / len(states),
+            "perft initial/2": perft_nodes,
+            "perft initial/2 nodes per second": perft_rate,
+            "legal actions per second": rate(legal_actions, min_time),
+            "legal walls per second": rate(legal_walls, min_time),
+            "random playouts per second": rate(playouts_per_second, min_time),
+            "random playout plies": sum(plies) / len(plies),
+        }
+        results["%ix%i" % (size, size)].update(search_rates(package, states, search_positions, search_time))
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Descriptions of every perft count that changed and every rate or timing that got worse by more than threshold"""
+    regressions = []
+    for name, nodes in baseline.get("perft", {}).items():
+        if name in results["perft"] and results["perft"][name] != nodes:
+            regressions.append("perft %s: %i nodes, baseline has %i" % (name, results["perft"][name], nodes))
+    for name, baseline_rate in baseline.get("rates", {}).items():
+        if name in results["rates"] and results["rates"][name] < baseline_rate * (1 - threshold):
+            regressions.append("%s: %.0f/s, baseline has %.0f/s (%+.0f%%)" % (
+                name, results["rates"][name], baseline_rate, 100 * (results["rates"][name] / baseline_rate - 1)))
+    for name, baseline_time in baseline.get("timings", {}).items():
+        if name in results["timings"] and results["timings"][name] > baseline_time * (1 + threshold):
+            regressions.append("%s: %.4fs, baseline has %.4fs (%+.0f%%)" % (
+                name, results["timings"][name], baseline_time, 100 * (results["timings"][name] / baseline_time - 1)))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks move generation, state transitions and playouts")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative drop in throughput")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent on each throughput measurement")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[], help="board sizes for the scaling benchmark")
+    parser.add_argument("--search-time", type=float, default=0.5,
+                        help="seconds per search in the scaling benchmark's search measurements")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.min_time)
+    if args.sizes:
+        results["scaling"] = scaling_benchmarks(args.sizes, args.min_time, search_time=args.search_time)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
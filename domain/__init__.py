@@ -1,3 +1,3 @@
-from domain.actions import *
-from domain.state import QuoridorState
-from domain.state import initial_state
+from .actions import *
+from .state import QuoridorState
+from .state import initial_state
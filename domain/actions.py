@@ -1,6 +1,9 @@
 from __future__ import annotations
-import domain.state as q_state
-from typing import Union, Tuple
+import inspect
+from . import state as q_state
+from . import board
+from . import distances
+from . import zobrist
 
 def pos_add(x: tuple[int, int], y: tuple[int, int]) -> tuple[int, int]:
     return x[0] + y[0], x[1] + y[1]
@@ -16,194 +19,186 @@ direction_deltas = {
     'W': (-1, 0),
 }
 
-cutDict = {"v": [(1, 0), (0, 1)], "h": [(0, 1), (1, 0)]}
+# Every action object on the board, by constructor arguments and by name
+_interned = {}
+_interned_by_name = {}
 
-class MoveAction:
 
+class InternedAction(type):
+    """
+    Metaclass of the action classes: constructing an action that already exists returns the existing object,
+    so there is one object per action and == and hash work by identity.
+    Walls off the board are never applicable and are not interned, so odd input cannot grow the tables.
+    """
+
+    def __call__(cls, *args, **kwargs):
+        if kwargs:
+            # Keyword arguments are looked up as the positional arguments they stand for
+            args = inspect.signature(cls.__init__).bind(None, *args, **kwargs).args[1:]
+        action = _interned.get((cls, args))
+        if action is None:
+            action = super().__call__(*args)
+            action._arguments = args
+            if getattr(action, "on_board", True):
+                # Different spellings of one action, such as "V" and "v" for a wall, get the same object
+                action = _interned_by_name.setdefault(action.name, action)
+                _interned[(cls, args)] = action
+        return action
+
+
+class Action(metaclass=InternedAction):
+    """What the action classes share; the subclasses set name in __init__"""
+    # Index in DEFAULT_QUORIDOR_ACTION_LIBRARY, None for actions that are not in it
+    id = None
+
+    def pass_turn(self, state: q_state.QuoridorState):
+        state.agent_to_move = 1 - state.agent_to_move
+        state.key ^= zobrist.SIDE_KEY
+
+    def __repr__(self):
+        return self.name
+
+    def __reduce__(self):
+        # Unpickling goes through the constructor and so gets the interned object
+        return self.__class__, self._arguments
+
+
+class MoveAction(Action):
     def __init__(self, agent_direction):
         self.agent_delta = direction_deltas.get(agent_direction)
+        self.step = board.DIRECTION_STEP[agent_direction]
+        self.edge_shift = board.DIRECTION_SHIFT[agent_direction]
         self.name = "Move(%s)" % agent_direction
 
     def calculate_positions(self, current_agent_position: tuple[int, int]) -> tuple[int, int]:
         return pos_add(current_agent_position, self.agent_delta)
 
     def is_applicable(self, agent_index: int,  state: q_state.QuoridorState) -> bool:
-        current_agent_position, _ = state.agent_positions[agent_index]
-        new_agent_position = self.calculate_positions(current_agent_position)
-        if new_agent_position[0] < 0 or new_agent_position[0] > 8 or new_agent_position[1] < 0 or new_agent_position[1] > 8:
+        cell = state.agent_cell(agent_index)
+        if state.blocked >> (self.edge_shift + cell) & 1:
             return False
-        if not state.not_blocked_by_wall(current_agent_position, self.name[-2].lower()):
-            return False
-        return state.free_at(new_agent_position)
+        return cell + self.step != state.agent_cell(1 - agent_index)
 
     def result(self, agent_index: int, state: q_state.QuoridorState):
-        current_agent_position, agent_char = state.agent_positions[agent_index]
-        new_agent_position = self.calculate_positions(current_agent_position)
-        state.agent_positions[agent_index] = (new_agent_position, agent_char)
+        cell = state.agent_cell(agent_index)
+        state.pawns += self.step << board.PAWN_SHIFT[agent_index]
+        state.key ^= zobrist.PAWN_KEYS[agent_index][cell] ^ zobrist.PAWN_KEYS[agent_index][cell + self.step]
         self.pass_turn(state)
 
-    def pass_turn(self, state: q_state.QuoridorState):
-        state.agent_to_move = int(not bool(state.agent_to_move))
-
-    def __repr__(self):
-        return self.name
-    
-    def __eq__(self, other) -> bool:
-        """
-        Notice that we here only compare the agent positions and box positions, but ignore all other fields.
-        That means that two states with identical positions but e.g. different parent will be seen as equal.
-        """
-        if isinstance(other, self.__class__):
-            return self.name == other.name
-        else:
-            return False
-    
-class JumpStraightAction:
 
+class JumpStraightAction(Action):
     def __init__(self, agent_direction):
         self.agent_delta_midway = direction_deltas.get(agent_direction)
         self.agent_delta = pos_add(direction_deltas.get(agent_direction), direction_deltas.get(agent_direction))
+        self.step_midway = board.DIRECTION_STEP[agent_direction]
+        self.step = 2 * self.step_midway
+        self.edge_shift = board.DIRECTION_SHIFT[agent_direction]
         self.name = "JumpStraight(%s)" % agent_direction
 
     def calculate_positions(self, current_agent_position: tuple[int, int]) -> tuple[int, int]:
         return pos_add(current_agent_position, self.agent_delta_midway), pos_add(current_agent_position, self.agent_delta)
 
     def is_applicable(self, agent_index: int,  state: q_state.QuoridorState) -> bool:
-        current_agent_position, _ = state.agent_positions[agent_index]
-        midway_agent_position, new_agent_position = self.calculate_positions(current_agent_position)
-        if new_agent_position[0] < 0 or new_agent_position[0] > 8 or new_agent_position[1] < 0 or new_agent_position[1] > 8:
+        cell = state.agent_cell(agent_index)
+        midway_cell = cell + self.step_midway
+        if midway_cell != state.agent_cell(1 - agent_index):
             return False
-        if not midway_agent_position == state.agent_positions[int(not bool(agent_index))][0]:
+        if state.blocked >> (self.edge_shift + cell) & 1:
             return False
-        if not state.not_blocked_by_wall(current_agent_position, self.name[-2].lower()):
-            return False
-        if not state.not_blocked_by_wall(midway_agent_position, self.name[-2].lower()):
+        if state.blocked >> (self.edge_shift + midway_cell) & 1:
             return False
         return True
 
     def result(self, agent_index: int, state: q_state.QuoridorState):
-        current_agent_position, agent_char = state.agent_positions[agent_index]
-        new_agent_position = self.calculate_positions(current_agent_position)[1]
-        state.agent_positions[agent_index] = (new_agent_position, agent_char)
+        cell = state.agent_cell(agent_index)
+        state.pawns += self.step << board.PAWN_SHIFT[agent_index]
+        state.key ^= zobrist.PAWN_KEYS[agent_index][cell] ^ zobrist.PAWN_KEYS[agent_index][cell + self.step]
         self.pass_turn(state)
 
-    def pass_turn(self, state: q_state.QuoridorState):
-        state.agent_to_move = int(not bool(state.agent_to_move))
-
-    def __repr__(self):
-        return self.name
-    
-    def __eq__(self, other) -> bool:
-        """
-        Notice that we here only compare the agent positions and box positions, but ignore all other fields.
-        That means that two states with identical positions but e.g. different parent will be seen as equal.
-        """
-        if isinstance(other, self.__class__):
-            return self.name == other.name
-        else:
-            return False
-    
-class JumpSideAction:
 
+class JumpSideAction(Action):
     def __init__(self, agent_direction1, agent_direction2):
         self.agent_delta_midway = direction_deltas.get(agent_direction1)
         self.agent_delta = pos_add(direction_deltas.get(agent_direction1), direction_deltas.get(agent_direction2))
+        self.step_midway = board.DIRECTION_STEP[agent_direction1]
+        self.step = self.step_midway + board.DIRECTION_STEP[agent_direction2]
+        self.edge_shift = board.DIRECTION_SHIFT[agent_direction1]
+        self.side_edge_shift = board.DIRECTION_SHIFT[agent_direction2]
         self.name = "JumpSide(%s, %s)" % (agent_direction1, agent_direction2)
 
     def calculate_positions(self, current_agent_position: tuple[int, int]) -> tuple[int, int]:
         return pos_add(current_agent_position, self.agent_delta_midway), pos_add(current_agent_position, self.agent_delta)
 
     def is_applicable(self, agent_index: int,  state: q_state.QuoridorState) -> bool:
-        current_agent_position, _ = state.agent_positions[agent_index]
-        midway_agent_position, new_agent_position = self.calculate_positions(current_agent_position)
-        if new_agent_position[0] < 0 or new_agent_position[0] > 8 or new_agent_position[1] < 0 or new_agent_position[1] > 8:
+        cell = state.agent_cell(agent_index)
+        midway_cell = cell + self.step_midway
+        if midway_cell != state.agent_cell(1 - agent_index):
             return False
-        if not midway_agent_position == state.agent_positions[int(not bool(agent_index))][0]:
+        if state.blocked >> (self.edge_shift + cell) & 1:
             return False
-        if not state.not_blocked_by_wall(current_agent_position, self.name[-5].lower()):
+        # Jumping to the side is only allowed when the straight jump is cut off by a wall or the border
+        if not state.blocked >> (self.edge_shift + midway_cell) & 1:
             return False
-        if state.not_blocked_by_wall(midway_agent_position, self.name[-5].lower()):
-            return False
-        if not state.not_blocked_by_wall(midway_agent_position, self.name[-2].lower()):
+        if state.blocked >> (self.side_edge_shift + midway_cell) & 1:
             return False
         return True
 
     def result(self, agent_index: int, state: q_state.QuoridorState):
-        current_agent_position, agent_char = state.agent_positions[agent_index]
-        new_agent_position = self.calculate_positions(current_agent_position)[1]
-        state.agent_positions[agent_index] = (new_agent_position, agent_char)
+        cell = state.agent_cell(agent_index)
+        state.pawns += self.step << board.PAWN_SHIFT[agent_index]
+        state.key ^= zobrist.PAWN_KEYS[agent_index][cell] ^ zobrist.PAWN_KEYS[agent_index][cell + self.step]
         self.pass_turn(state)
 
-    def pass_turn(self, state: q_state.QuoridorState):
-        state.agent_to_move = int(not bool(state.agent_to_move))
-
-    def __repr__(self):
-        return self.name
-    
-    def __eq__(self, other) -> bool:
-        """
-        Notice that we here only compare the agent positions and box positions, but ignore all other fields.
-        That means that two states with identical positions but e.g. different parent will be seen as equal.
-        """
-        if isinstance(other, self.__class__):
-            return self.name == other.name
-        else:
-            return False
-    
-class WallAction:
 
+class WallAction(Action):
     def __init__(self, position: tuple[int, int], orientation: str):
         self.position = position
-        self.orientation = orientation
-        self.name = "Wall(%i, %i, %s)" % (position[0], position[1], orientation)
+        self.orientation = orientation.lower()
+        self.name = "Wall(%i, %i, %s)" % (position[0], position[1], self.orientation)
+        self.on_board = board.wall_in_bounds(position)
+        if self.on_board:
+            self.slot = board.wall_slot(position)
+            self.wall_id = board.wall_id(self.orientation, self.slot)
+            self.cut = board.WALL_CUTS[self.orientation][self.slot]
+            self.edges = board.WALL_EDGES[self.orientation][self.slot]
 
     def is_applicable(self, agent_index: int,  state: q_state.QuoridorState) -> bool:
         if state.walls_left[agent_index] < 1:
             return False
-        if self.position[0] < 0 or self.position[0] > 7 or self.position[1] < 0 or self.position[1] > 7:
+        if not self.on_board:
             return False
-        if state.wall_at(self.position):
+        if not state.placeable_walls >> self.wall_id & 1:
             return False
-        if self.orientation.lower() == "v":
-            for dir in ['N', 'S']:
-                if state.wall_and_orientation_at(pos_add(self.position, direction_deltas[dir]), "v"):
-                    return False
-        if self.orientation.lower() == "h":
-            for dir in ['E', 'W']:
-                if state.wall_and_orientation_at(pos_add(self.position, direction_deltas[dir]), "h"):
-                    return False
         if state.wall_blocks(self.position, self.orientation):
             return False
         return True
 
     def result(self, agent_index: int, state: q_state.QuoridorState):
-        state.walls_left[agent_index] -= 1
-        state.wall_positions.append((self.position, self.orientation))
-        cutVertices = [[state.findVertice(self.position), state.findVertice(pos_add(self.position, cutDict[self.orientation][0]))], [state.findVertice(pos_add(self.position, (1,1))), state.findVertice(pos_add(self.position, cutDict[self.orientation][1]))]]
-        for vpair in cutVertices:
-            state.graph.remove_edge(vpair[0], vpair[1])
+        walls_left = list(state.walls_left)
+        walls_left[agent_index] -= 1
+        state.walls_left = tuple(walls_left)
+        if self.orientation == "v":
+            state.vertical_walls |= 1 << self.slot
+        else:
+            state.horizontal_walls |= 1 << self.slot
+        state.blocked |= self.cut
+        state.placeable_walls &= ~board.WALL_CONFLICTS[self.wall_id]
+        # Distance maps already computed for the old walls are repaired around the cut instead of dropped
+        state._distance_maps = tuple(None if distance_map is None
+                                     else distances.update_distance_map(distance_map, state.blocked, self.edges)
+                                     for distance_map in state._distance_maps)
+        state.key ^= (zobrist.WALL_KEYS[self.orientation][self.slot]
+                      ^ zobrist.WALLS_LEFT_KEYS[agent_index][walls_left[agent_index] + 1]
+                      ^ zobrist.WALLS_LEFT_KEYS[agent_index][walls_left[agent_index]])
         self.pass_turn(state)
 
-    def pass_turn(self, state: q_state.QuoridorState):
-        state.agent_to_move = int(not bool(state.agent_to_move))
 
-    def __repr__(self):
-        return self.name
-    
-    def __eq__(self, other) -> bool:
-        """
-        Notice that we here only compare the agent positions and box positions, but ignore all other fields.
-        That means that two states with identical positions but e.g. different parent will be seen as equal.
-        """
-        if isinstance(other, self.__class__):
-            return self.name == other.name
-        else:
-            return False
-    
+# Any of the four action classes; their common base, so it works in isinstance on every Python version
+AnyAction = Action
+
 
-AnyAction = Union[MoveAction, JumpStraightAction, JumpSideAction, WallAction]
 # An action library for the multi agent pathfinding
-WALL_ACTIONS = [WallAction((i1, i2), o) for i1 in range(8) for i2 in range(8) for o in ["v", "h"]]
+WALL_ACTIONS = [WallAction((i1, i2), o) for i1 in range(board.WALL_SIZE) for i2 in range(board.WALL_SIZE) for o in ["v", "h"]]
 
 DEFAULT_QUORIDOR_ACTION_LIBRARY = [
     MoveAction("N"),
@@ -223,3 +218,57 @@ DEFAULT_QUORIDOR_ACTION_LIBRARY = [
     JumpSideAction("W", "N"),
     JumpSideAction("W", "S"),
 ] + WALL_ACTIONS
+
+
+for _action_id, _action in enumerate(DEFAULT_QUORIDOR_ACTION_LIBRARY):
+    _action.id = _action_id
+
+
+def action_to_string(action: AnyAction) -> str:
+    """The text syntax of an action, see get_action_from_string: "mn", "jne", "w34v" and so on"""
+    if isinstance(action, WallAction):
+        separator = "," if board.WALL_SIZE > 10 else ""
+        return "w%i%s%i%s" % (action.position[0], separator, action.position[1], action.orientation)
+    prefix = "m" if isinstance(action, MoveAction) else "j"
+    return prefix + action.name[action.name.index("(") + 1:-1].replace(", ", "").lower()
+
+
+# ACTION_STRINGS[action id] is the action in the text syntax
+ACTION_STRINGS = [action_to_string(action) for action in DEFAULT_QUORIDOR_ACTION_LIBRARY]
+
+
+def _spellings() -> dict[str, int]:
+    spellings = {string: action_id for action_id, string in enumerate(ACTION_STRINGS)}
+    for action in WALL_ACTIONS:
+        x, y = action.position
+        spellings["w%i,%i%s" % (x, y, action.orientation)] = action.id
+        if x < 10 and y < 10:
+            spellings["w%i%i%s" % (x, y, action.orientation)] = action.id
+    return spellings
+
+
+# Every accepted spelling of every action, without spaces and in lower case, to its id
+ACTION_IDS_BY_STRING = _spellings()
+
+
+def parse_action_id(string: str) -> int:
+    """The id of the action written in the text syntax (see get_action_from_string), None if it is not one"""
+    action_id = ACTION_IDS_BY_STRING.get(string)
+    if action_id is None:
+        action_id = ACTION_IDS_BY_STRING.get("".join(string.split()).lower())
+    return action_id
+
+
+def action_id_to_string(action_id: int) -> str:
+    return ACTION_STRINGS[action_id]
+
+
+def get_action_from_string(string: str) -> AnyAction:
+    """
+    Parses the text syntax used by the game scripts and the server: "mn" moves north, "jn" jumps straight north,
+    "jne" jumps north then east, "w34v" places a vertical wall at (3, 4). On boards with more than ten wall
+    columns the coordinates are separated by a comma, "w10,3h"; it is accepted on any board. Case and spaces are ignored.
+    Returns None if the string is not an action; whether the action is applicable is up to the caller.
+    """
+    action_id = parse_action_id(string)
+    return None if action_id is None else DEFAULT_QUORIDOR_ACTION_LIBRARY[action_id]
@@ -0,0 +1,250 @@
+"""
+Static board geometry and the bit layout used by QuoridorState.
+
+Cells are numbered row by row, cell = x + y * SIZE, and a set of cells is an int with bit `cell` set.
+Wall slots are numbered the same way on the (SIZE - 1) x (SIZE - 1) wall grid, slot = x + y * WALL_SIZE.
+
+Blocked edges are kept in a single int with one block of CELLS bits per direction (N, S, E, W),
+so "can I leave cell c going in direction d" is one bit test: blocked >> (DIRECTION_SHIFT[d] + c) & 1.
+The board border is folded into the blocked edges, so moves off the board look like moves into a wall.
+
+The package is the standard 9x9 game with 10 walls each. domain.engine.load builds further copies of the
+package for other sizes, setting BOARD_SIZE and WALLS_PER_PLAYER on the package before this module runs.
+"""
+from __future__ import annotations
+import random
+import sys
+
+DEFAULT_SIZE = 9
+DEFAULT_WALLS_PER_PLAYER = 10
+
+_package = sys.modules[__package__]
+SIZE = getattr(_package, "BOARD_SIZE", DEFAULT_SIZE)
+WALL_SIZE = SIZE - 1
+CELLS = SIZE * SIZE
+WALL_SLOTS = WALL_SIZE * WALL_SIZE
+WALLS_PER_PLAYER = getattr(_package, "WALLS_PER_PLAYER", DEFAULT_WALLS_PER_PLAYER)
+
+DIRECTIONS = ['N', 'S', 'E', 'W']
+DIRECTION_SHIFT = {direction: i * CELLS for i, direction in enumerate(DIRECTIONS)}
+DIRECTION_DELTA = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}
+DIRECTION_STEP = {direction: dx + dy * SIZE for direction, (dx, dy) in DIRECTION_DELTA.items()}
+OPPOSITE_DIRECTION = {'N': 'S', 'S': 'N', 'E': 'W', 'W': 'E'}
+
+# Packed pawn positions: agent i's cell lives in bits [PAWN_BITS * i, PAWN_BITS * (i + 1)).
+PAWN_BITS = (CELLS - 1).bit_length()
+PAWN_MASK = (1 << PAWN_BITS) - 1
+PAWN_SHIFT = (0, PAWN_BITS)
+
+
+def cell_index(position: tuple[int, int]) -> int:
+    return position[0] + position[1] * SIZE
+
+
+def cell_position(cell: int) -> tuple[int, int]:
+    return cell % SIZE, cell // SIZE
+
+
+def in_bounds(position: tuple[int, int]) -> bool:
+    return 0 <= position[0] < SIZE and 0 <= position[1] < SIZE
+
+
+def wall_slot(position: tuple[int, int]) -> int:
+    return position[0] + position[1] * WALL_SIZE
+
+
+def wall_position(slot: int) -> tuple[int, int]:
+    return slot % WALL_SIZE, slot // WALL_SIZE
+
+
+def wall_in_bounds(position: tuple[int, int]) -> bool:
+    return 0 <= position[0] < WALL_SIZE and 0 <= position[1] < WALL_SIZE
+
+
+# Walls of both orientations share one numbering: wall id = WALL_ID_OFFSET[orientation] + slot
+WALL_ID_OFFSET = {"v": 0, "h": WALL_SLOTS}
+ALL_WALLS = (1 << 2 * WALL_SLOTS) - 1
+
+
+def wall_id(orientation: str, slot: int) -> int:
+    return WALL_ID_OFFSET[orientation] + slot
+
+
+def pack_pawns(cell0: int, cell1: int) -> int:
+    return cell0 | cell1 << PAWN_BITS
+
+
+def edge_bits(cell: int, direction: str) -> int:
+    """Bits that mark the edge leaving `cell` in `direction` as blocked, from both sides"""
+    other = cell + DIRECTION_STEP[direction]
+    return 1 << (DIRECTION_SHIFT[direction] + cell) | 1 << (DIRECTION_SHIFT[OPPOSITE_DIRECTION[direction]] + other)
+
+
+BOARD_MASK = (1 << CELLS) - 1
+ROW_MASKS = [sum(1 << cell_index((x, y)) for x in range(SIZE)) for y in range(SIZE)]
+COLUMN_MASKS = [sum(1 << cell_index((x, y)) for y in range(SIZE)) for x in range(SIZE)]
+
+# Agent 0 starts on row 0 and races to the last row, agent 1 the other way round.
+GOAL_ROWS = (SIZE - 1, 0)
+GOAL_MASKS = (ROW_MASKS[GOAL_ROWS[0]], ROW_MASKS[GOAL_ROWS[1]])
+
+BORDER_BLOCKED = (ROW_MASKS[0] << DIRECTION_SHIFT['N']
+                  | ROW_MASKS[SIZE - 1] << DIRECTION_SHIFT['S']
+                  | COLUMN_MASKS[SIZE - 1] << DIRECTION_SHIFT['E']
+                  | COLUMN_MASKS[0] << DIRECTION_SHIFT['W'])
+
+
+def _wall_cut(slot: int, orientation: str) -> int:
+    x, y = wall_position(slot)
+    cell = cell_index((x, y))
+    if orientation == "v":
+        # A vertical wall separates column x from column x + 1 on rows y and y + 1
+        return edge_bits(cell, 'E') | edge_bits(cell + SIZE, 'E')
+    # A horizontal wall separates row y from row y + 1 on columns x and x + 1
+    return edge_bits(cell, 'S') | edge_bits(cell + 1, 'S')
+
+
+# WALL_CUTS[orientation][slot] is what placing that wall ORs into the blocked edges.
+WALL_CUTS = {orientation: [_wall_cut(slot, orientation) for slot in range(WALL_SLOTS)]
+             for orientation in ["v", "h"]}
+
+
+def split_blocked(blocked: int) -> tuple[int, int, int, int]:
+    """Splits the blocked edges into one cell mask per direction (N, S, E, W)"""
+    return (blocked & BOARD_MASK,
+            blocked >> DIRECTION_SHIFT['S'] & BOARD_MASK,
+            blocked >> DIRECTION_SHIFT['E'] & BOARD_MASK,
+            blocked >> DIRECTION_SHIFT['W'] & BOARD_MASK)
+
+
+def expand(reach: int, blocked_n: int, blocked_s: int, blocked_e: int, blocked_w: int) -> int:
+    """Grows a set of cells by one step in every direction that is not blocked"""
+    return (reach
+            | (reach & ~blocked_s) << SIZE
+            | (reach & ~blocked_n) >> SIZE
+            | (reach & ~blocked_e) << 1
+            | (reach & ~blocked_w) >> 1)
+
+
+def has_path(cell: int, goal_mask: int, blocked: int) -> bool:
+    """Bit-parallel flood fill from `cell` until it touches `goal_mask` or stops growing"""
+    blocked_n, blocked_s, blocked_e, blocked_w = split_blocked(blocked)
+    reach = 1 << cell
+    while not reach & goal_mask:
+        grown = expand(reach, blocked_n, blocked_s, blocked_e, blocked_w)
+        if grown == reach:
+            return False
+        reach = grown
+    return True
+
+
+def _neighbours(cell: int) -> list[tuple[int, int]]:
+    x, y = cell_position(cell)
+    return [(DIRECTION_SHIFT[direction] + cell, cell + DIRECTION_STEP[direction]) for direction in DIRECTIONS
+            if in_bounds((x + DIRECTION_DELTA[direction][0], y + DIRECTION_DELTA[direction][1]))]
+
+
+# NEIGHBOURS[cell] lists (blocked bit index, neighbouring cell) for every on-board neighbour of the cell.
+NEIGHBOURS = [_neighbours(cell) for cell in range(CELLS)]
+
+
+def _wall_edges(slot: int, orientation: str) -> tuple[tuple[int, int, int], tuple[int, int, int]]:
+    cell = cell_index(wall_position(slot))
+    if orientation == "v":
+        return (cell, cell + 1, DIRECTION_SHIFT['E'] + cell), (cell + SIZE, cell + SIZE + 1, DIRECTION_SHIFT['E'] + cell + SIZE)
+    return (cell, cell + SIZE, DIRECTION_SHIFT['S'] + cell), (cell + 1, cell + SIZE + 1, DIRECTION_SHIFT['S'] + cell + 1)
+
+
+# WALL_EDGES[orientation][slot] are the two edges the wall cuts, as (cell, neighbouring cell, blocked bit).
+WALL_EDGES = {orientation: [_wall_edges(slot, orientation) for slot in range(WALL_SLOTS)]
+              for orientation in ["v", "h"]}
+
+
+def _edge_labels() -> list[int]:
+    rng = random.Random(SIZE)
+    labels = [0] * (len(DIRECTIONS) * CELLS)
+    for cell in range(CELLS):
+        x, y = cell_position(cell)
+        for direction in ['S', 'E']:
+            dx, dy = DIRECTION_DELTA[direction]
+            if in_bounds((x + dx, y + dy)):
+                label = rng.getrandbits(64) or 1
+                labels[DIRECTION_SHIFT[direction] + cell] = label
+                labels[DIRECTION_SHIFT[OPPOSITE_DIRECTION[direction]] + cell + DIRECTION_STEP[direction]] = label
+    return labels
+
+
+# A fixed random 64-bit label per undirected edge, indexed by the edge's blocked bit from either side.
+EDGE_LABELS = _edge_labels()
+
+
+def _edge_walls() -> list[list[tuple[str, int]]]:
+    edge_walls = [[] for _ in range(len(DIRECTIONS) * CELLS)]
+    for orientation in ["v", "h"]:
+        for slot, edges in enumerate(WALL_EDGES[orientation]):
+            for a, b, bit in edges:
+                edge_walls[bit].append((orientation, slot))
+                for other_bit, other in NEIGHBOURS[b]:
+                    if other == a:
+                        edge_walls[other_bit].append((orientation, slot))
+    return edge_walls
+
+
+# EDGE_WALLS[bit] lists the (orientation, slot) walls that would cut the edge with that blocked bit.
+EDGE_WALLS = _edge_walls()
+
+
+def shortest_path_cells(cell: int, goal_mask: int, blocked: int) -> int:
+    """The set of cells that lie on at least one shortest path from `cell` to `goal_mask`"""
+    blocked_n, blocked_s, blocked_e, blocked_w = split_blocked(blocked)
+    layers = [1 << cell]
+    reach = layers[0]
+    while not reach & goal_mask:
+        grown = expand(reach, blocked_n, blocked_s, blocked_e, blocked_w)
+        if grown == reach:
+            return 0
+        layers.append(grown & ~reach)
+        reach = grown
+    # Walk the BFS layers back from the goal, keeping only cells that lead to the previous kept layer
+    on_path = layers[-1] & goal_mask
+    cells = on_path
+    for layer in reversed(layers[:-1]):
+        on_path = layer & expand(on_path, blocked_n, blocked_s, blocked_e, blocked_w)
+        cells |= on_path
+    return cells
+
+
+def _wall_touch_mask(slot: int) -> int:
+    cell = cell_index(wall_position(slot))
+    return 1 << cell | 1 << (cell + 1) | 1 << (cell + SIZE) | 1 << (cell + SIZE + 1)
+
+
+# WALL_TOUCH_MASKS[slot] are the four cells around a wall slot, whichever way the wall is turned.
+WALL_TOUCH_MASKS = [_wall_touch_mask(slot) for slot in range(WALL_SLOTS)]
+
+
+def _wall_conflicts(orientation: str, slot: int) -> int:
+    x, y = wall_position(slot)
+    # The wall itself and the crossing wall in the same slot
+    conflicts = 1 << wall_id("v", slot) | 1 << wall_id("h", slot)
+    # Walls of the same orientation one slot further along would overlap it
+    along = [(0, -1), (0, 1)] if orientation == "v" else [(-1, 0), (1, 0)]
+    for dx, dy in along:
+        if wall_in_bounds((x + dx, y + dy)):
+            conflicts |= 1 << wall_id(orientation, wall_slot((x + dx, y + dy)))
+    return conflicts
+
+
+# WALL_CONFLICTS[wall id] are the wall ids that can no longer be placed once that wall is on the board.
+# The relation is symmetric, so it also lists the placed walls that would rule the wall out.
+WALL_CONFLICTS = [_wall_conflicts(orientation, slot) for orientation in ["v", "h"] for slot in range(WALL_SLOTS)]
+
+
+def placeable_walls(horizontal_walls: int, vertical_walls: int) -> int:
+    """Wall ids that fit on the board geometrically, whether or not they would cut a pawn off"""
+    placeable = ALL_WALLS
+    for orientation, walls in (("v", vertical_walls), ("h", horizontal_walls)):
+        for slot in range(WALL_SLOTS):
+            if walls >> slot & 1:
+                placeable &= ~WALL_CONFLICTS[wall_id(orientation, slot)]
+    return placeable
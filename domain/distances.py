@@ -0,0 +1,87 @@
+from __future__ import annotations
+import heapq
+from . import board
+
+# Larger than any real distance on the board
+UNREACHABLE = board.CELLS
+
+
+def distance_map(goal_mask: int, blocked: int) -> list[int]:
+    """Steps from every cell to the nearest cell of `goal_mask`, ignoring pawns, computed one BFS layer at a time"""
+    blocked_n, blocked_s, blocked_e, blocked_w = board.split_blocked(blocked)
+    distances = [UNREACHABLE] * board.CELLS
+    reach = layer = goal_mask
+    distance = 0
+    while layer:
+        cells = layer
+        while cells:
+            lowest = cells & -cells
+            distances[lowest.bit_length() - 1] = distance
+            cells ^= lowest
+        grown = board.expand(reach, blocked_n, blocked_s, blocked_e, blocked_w)
+        layer = grown & ~reach
+        reach = grown
+        distance += 1
+    return distances
+
+
+def _supported(cell: int, distances: list[int], blocked: int, affected: set) -> bool:
+    """Whether the cell still has an open neighbour one step closer to the goal that keeps its distance"""
+    wanted = distances[cell] - 1
+    for bit, other in board.NEIGHBOURS[cell]:
+        if distances[other] == wanted and other not in affected and not blocked >> bit & 1:
+            return True
+    return False
+
+
+def update_distance_map(distances: list[int], blocked: int, removed_edges) -> list[int]:
+    """
+    Repairs a distance map after the edges in removed_edges, given as (cell, cell, blocked bit), were cut.
+    Distances can only grow, and only for cells whose every shortest route used a removed edge, so those
+    cells are found by walking outwards from the cut and only they are recomputed.
+    Returns a new list; `distances` itself is left untouched since other states may share it.
+    """
+    # Cells that lost the neighbour they were counting on, grouped by distance so that
+    # every cell is judged only after all cells closer to the goal
+    buckets = {}
+    for a, b, _ in removed_edges:
+        for cell, other in ((a, b), (b, a)):
+            if distances[cell] != UNREACHABLE and distances[cell] == distances[other] + 1:
+                buckets.setdefault(distances[cell], set()).add(cell)
+    if not buckets:
+        return distances
+
+    affected = set()
+    level = min(buckets)
+    while buckets:
+        candidates = buckets.pop(level, ())
+        for cell in candidates:
+            if cell in affected or _supported(cell, distances, blocked, affected):
+                continue
+            affected.add(cell)
+            for bit, other in board.NEIGHBOURS[cell]:
+                if distances[other] == level + 1 and not blocked >> bit & 1:
+                    buckets.setdefault(level + 1, set()).add(other)
+        level += 1
+    if not affected:
+        return distances
+
+    new_distances = list(distances)
+    heap = []
+    for cell in affected:
+        best = UNREACHABLE
+        for bit, other in board.NEIGHBOURS[cell]:
+            if other not in affected and not blocked >> bit & 1 and distances[other] + 1 < best:
+                best = distances[other] + 1
+        new_distances[cell] = best
+        if best != UNREACHABLE:
+            heapq.heappush(heap, (best, cell))
+    while heap:
+        distance, cell = heapq.heappop(heap)
+        if distance != new_distances[cell]:
+            continue
+        for bit, other in board.NEIGHBOURS[cell]:
+            if other in affected and not blocked >> bit & 1 and distance + 1 < new_distances[other]:
+                new_distances[other] = distance + 1
+                heapq.heappush(heap, (distance + 1, other))
+    return new_distances
@@ -0,0 +1,68 @@
+"""
+The game engine for other board sizes and wall counts.
+
+Every static table of the engine (cell and wall geometry, the action library, Zobrist keys, move generation
+tables, the race solver's move graph) is built when its module is imported, from the constants in domain.board.
+load(size, walls_per_player) imports a separate copy of the whole domain package with those constants changed,
+so every size gets its own tables, built once and cached, while the standard engine keeps its constants
+as plain module globals:
+
+    small = engine.load(5, 3)
+    state = small.initial_state
+    state.get_applicable_actions(small.DEFAULT_QUORIDOR_ACTION_LIBRARY)
+    small.movegen.legal_actions(state)
+
+States and actions only work with the engine that made them: every copy has its own classes, so isinstance
+and == do not hold between objects of different sizes. Code that works on other sizes takes the engine as
+a parameter and uses its modules throughout, as agents.mcts.MCTSAgent and agents.alphabeta.AlphaBetaAgent
+do (engine=...). Everything else is written for the standard board: the batched evaluators and playouts,
+parallel MCTS, self-play, opening books, the arena and domain.records, which also stores one byte per action.
+"""
+from __future__ import annotations
+import functools
+import importlib
+import importlib.util
+import os
+import sys
+import types
+from . import board
+
+MIN_SIZE = 3
+SUBMODULES = ["board", "zobrist", "distances", "walls", "actions", "state", "movegen", "race", "planes", "records"]
+
+
+def package_name(size: int, walls_per_player: int) -> str:
+    return "%s.size%i_walls%i" % (__package__, size, walls_per_player)
+
+
+@functools.lru_cache(maxsize=None)
+def load(size: int = board.DEFAULT_SIZE, walls_per_player: int = board.DEFAULT_WALLS_PER_PLAYER) -> types.ModuleType:
+    """
+    The domain package for a size x size board with walls_per_player walls each. It has the same contents as
+    domain itself, plus its submodules as attributes (board, state, movegen, race, ...).
+    The standard size returns the domain package itself.
+    """
+    if size < MIN_SIZE:
+        raise ValueError("board size must be at least %i, got %i" % (MIN_SIZE, size))
+    if walls_per_player < 0:
+        raise ValueError("walls per player must not be negative, got %i" % walls_per_player)
+    if size == board.DEFAULT_SIZE and walls_per_player == board.DEFAULT_WALLS_PER_PLAYER:
+        package = sys.modules[__package__]
+    else:
+        name = package_name(size, walls_per_player)
+        directory = os.path.dirname(os.path.abspath(__file__))
+        spec = importlib.util.spec_from_file_location(name, os.path.join(directory, "__init__.py"),
+                                                      submodule_search_locations=[directory])
+        package = importlib.util.module_from_spec(spec)
+        # Read by domain.board when the copy imports it
+        package.BOARD_SIZE = size
+        package.WALLS_PER_PLAYER = walls_per_player
+        sys.modules[name] = package
+        try:
+            spec.loader.exec_module(package)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    for submodule in SUBMODULES:
+        importlib.import_module("%s.%s" % (package.__name__, submodule))
+    return package
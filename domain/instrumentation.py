@@ -0,0 +1,141 @@
+"""
+Opt-in call counters and timers for the engine's hot paths.
+
+Nothing here runs until enable() is called: it then wraps the functions listed in INSTRUMENTED in place,
+and disable() puts the originals back, so a disabled engine runs exactly the code it always did.
+Times are inclusive, e.g. QuoridorState.legal_walls includes the walls.blocking_walls call it makes.
+
+    instrumentation.enable()
+    simulate_games(initial_state, 1, 100)
+    print(instrumentation.stats())
+    instrumentation.disable()
+"""
+from __future__ import annotations
+import cProfile
+import functools
+import pstats
+import time
+from . import actions
+from . import board
+from . import distances
+from . import movegen
+from . import state as q_state
+from . import walls
+
+# (owner, attribute name) of every wrapped function; owner is a module or a class
+INSTRUMENTED = [(q_state.QuoridorState, name) for name in
+                ["result", "apply", "undo", "detached_copy", "copy", "get_applicable_actions", "is_applicable",
+                 "is_terminal", "wall_blocks", "blocking_walls", "legal_walls", "distance_map"]]
+INSTRUMENTED += [(action_type, name)
+                 for action_type in [actions.MoveAction, actions.JumpStraightAction, actions.JumpSideAction,
+                                     actions.WallAction]
+                 for name in ["is_applicable", "result"]]
+INSTRUMENTED += [(walls, "blocking_walls"), (distances, "distance_map"), (distances, "update_distance_map"),
+                 (board, "has_path"), (board, "shortest_path_cells"),
+                 (movegen, "legal_action_mask"), (movegen, "legal_action_indices"), (movegen, "legal_actions")]
+
+enabled = False
+_originals = {}
+_calls = {}
+_times = {}
+_branching_factors = {}
+_playout_lengths = {}
+
+
+def _name(owner, attribute: str) -> str:
+    return "%s.%s" % (owner.__name__.rsplit(".", 1)[-1], attribute)
+
+
+def _wrap(name: str, function, branching=None):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return_value = function(*args, **kwargs)
+        finally:
+            _times[name] = _times.get(name, 0.0) + time.perf_counter() - start
+            _calls[name] = _calls.get(name, 0) + 1
+        if branching is not None:
+            record_branching_factor(branching(return_value))
+        return return_value
+    return wrapper
+
+
+def enable():
+    """Starts counting; the counts gathered so far are kept, see reset()"""
+    global enabled
+    if enabled:
+        return
+    for owner, attribute in INSTRUMENTED:
+        original = owner.__dict__[attribute]
+        _originals[(owner, attribute)] = original
+        # The two move generators also record how many actions they found
+        branching = None
+        if (owner, attribute) == (q_state.QuoridorState, "get_applicable_actions"):
+            branching = len
+        elif (owner, attribute) == (movegen, "legal_action_mask"):
+            branching = lambda mask: int(mask.sum())
+        setattr(owner, attribute, _wrap(_name(owner, attribute), original, branching))
+    enabled = True
+
+
+def disable():
+    """Restores the original functions; the counts are kept until reset()"""
+    global enabled
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+    _originals.clear()
+    enabled = False
+
+
+def reset():
+    _calls.clear()
+    _times.clear()
+    _branching_factors.clear()
+    _playout_lengths.clear()
+
+
+def record_branching_factor(actions_available: int):
+    _branching_factors[actions_available] = _branching_factors.get(actions_available, 0) + 1
+
+
+def record_playout(plies: int):
+    """Called by the playout loops when instrumentation is enabled"""
+    _playout_lengths[plies] = _playout_lengths.get(plies, 0) + 1
+
+
+def _summary(histogram: dict[int, int]) -> dict:
+    count = sum(histogram.values())
+    if count == 0:
+        return {"count": 0}
+    return {"count": count,
+            "mean": sum(value * times for value, times in histogram.items()) / count,
+            "min": min(histogram),
+            "max": max(histogram),
+            "histogram": dict(sorted(histogram.items()))}
+
+
+def stats() -> dict:
+    """A snapshot of everything counted so far; the functions are sorted by cumulative time"""
+    functions = {name: {"calls": _calls[name],
+                        "time": _times[name],
+                        "time_per_call": _times[name] / _calls[name]}
+                 for name in sorted(_calls, key=lambda name: -_times[name])}
+    return {"functions": functions,
+            "branching_factor": _summary(_branching_factors),
+            "playout_length": _summary(_playout_lengths)}
+
+
+def profile(function, *args, output: str = None, sort: str = "cumulative", limit: int = 30, **kwargs):
+    """
+    Runs function(*args, **kwargs) under cProfile, prints the top `limit` entries sorted by `sort`
+    and, when `output` is given, dumps the raw profile there for pstats or snakeviz.
+    Returns the function's return value and the pstats.Stats.
+    """
+    profiler = cProfile.Profile()
+    return_value = profiler.runcall(function, *args, **kwargs)
+    if output is not None:
+        profiler.dump_stats(output)
+    profile_stats = pstats.Stats(profiler)
+    profile_stats.sort_stats(sort).print_stats(limit)
+    return return_value, profile_stats
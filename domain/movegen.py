@@ -0,0 +1,142 @@
+from __future__ import annotations
+import numpy as np
+from . import board
+from . import state as q_state
+from .actions import MoveAction, JumpStraightAction, WallAction, DEFAULT_QUORIDOR_ACTION_LIBRARY
+
+# Index of an edge that is never blocked and one that always is, appended after the real blocked bits
+OPEN_EDGE = len(board.DIRECTIONS) * board.CELLS
+CLOSED_EDGE = OPEN_EDGE + 1
+EDGE_BYTES = (CLOSED_EDGE + 8) // 8
+
+WALL_BYTES = (2 * board.WALL_SLOTS + 7) // 8
+NO_CELL = -1
+
+
+def _pawn_tables(pawn_actions: list) -> dict[str, np.ndarray]:
+    """Per (pawn action, cell) lookups of the edges that must be open or closed and the cells involved"""
+    shape = (len(pawn_actions), board.CELLS)
+    tables = {
+        "is_move": np.array([isinstance(action, MoveAction) for action in pawn_actions]),
+        "target": np.full(shape, NO_CELL, dtype=np.int16),
+        "midway": np.full(shape, NO_CELL, dtype=np.int16),
+        "open1": np.full(shape, CLOSED_EDGE, dtype=np.int16),
+        "open2": np.full(shape, OPEN_EDGE, dtype=np.int16),
+        "closed": np.full(shape, CLOSED_EDGE, dtype=np.int16),
+    }
+    for i, action in enumerate(pawn_actions):
+        is_move = isinstance(action, MoveAction)
+        dx, dy = action.agent_delta if is_move else action.agent_delta_midway
+        for cell in range(board.CELLS):
+            x, y = board.cell_position(cell)
+            # Steps that leave the board are blocked by the border, so they keep the CLOSED_EDGE default
+            if not board.in_bounds((x + dx, y + dy)):
+                continue
+            tables["open1"][i, cell] = action.edge_shift + cell
+            tables["target"][i, cell] = cell + action.step
+            if is_move:
+                continue
+            midway = cell + action.step_midway
+            tables["midway"][i, cell] = midway
+            if isinstance(action, JumpStraightAction):
+                tables["open2"][i, cell] = action.edge_shift + midway
+            else:
+                tables["open2"][i, cell] = action.side_edge_shift + midway
+                tables["closed"][i, cell] = action.edge_shift + midway
+    return tables
+
+
+def _wall_tables(wall_actions: list[WallAction]) -> dict[str, np.ndarray]:
+    """Per wall action, its wall id (see board.wall_id)"""
+    return {"index": np.array([action.wall_id for action in wall_actions], dtype=np.int16)}
+
+
+def unpack_bits(value: int, num_bytes: int) -> np.ndarray:
+    """The little-endian bits of `value` as a bool array of length 8 * num_bytes"""
+    return np.unpackbits(np.frombuffer(value.to_bytes(num_bytes, 'little'), dtype=np.uint8), bitorder='little').view(bool)
+
+
+PAWN_ACTION_INDICES = np.array([i for i, action in enumerate(DEFAULT_QUORIDOR_ACTION_LIBRARY) if not isinstance(action, WallAction)])
+WALL_ACTION_INDICES = np.array([i for i, action in enumerate(DEFAULT_QUORIDOR_ACTION_LIBRARY) if isinstance(action, WallAction)])
+PAWN_TABLES = _pawn_tables([DEFAULT_QUORIDOR_ACTION_LIBRARY[i] for i in PAWN_ACTION_INDICES])
+WALL_TABLES = _wall_tables([DEFAULT_QUORIDOR_ACTION_LIBRARY[i] for i in WALL_ACTION_INDICES])
+
+
+# GOAL_CELLS[agent, cell]: whether the cell is on the agent's goal row
+GOAL_CELLS = np.array([[board.GOAL_MASKS[i] >> cell & 1 for cell in range(board.CELLS)] for i in range(2)], dtype=bool)
+
+
+def goal_distances(blocked: np.ndarray, cells: np.ndarray) -> np.ndarray:
+    """
+    Shortest goal distances of both agents, ignoring pawns, for a batch of positions by one vectorised flood fill.
+    blocked is (N, at least 4 * CELLS) unpacked blocked bits (see unpack_bits), cells is (N, 2) pawn cells.
+    Returns (N, 2) distances, board.CELLS where an agent has no path.
+    """
+    count = len(blocked)
+    size = board.SIZE
+    num_cells = board.CELLS
+    blocked = np.concatenate([blocked, blocked])
+    open_n, open_s, open_e, open_w = (~blocked[:, i * num_cells:(i + 1) * num_cells] for i in range(4))
+    # Rows 0..count-1 search for agent 0, rows count..2*count-1 for agent 1
+    reach = np.zeros((2 * count, num_cells), dtype=bool)
+    reach[np.arange(2 * count), np.concatenate([cells[:, 0], cells[:, 1]])] = True
+    goal = np.repeat(GOAL_CELLS, count, axis=0)
+    distances = np.full(2 * count, num_cells, dtype=np.int32)
+    searching = np.ones(2 * count, dtype=bool)
+    for distance in range(num_cells):
+        arrived = searching & (reach & goal).any(axis=1)
+        distances[arrived] = distance
+        searching &= ~arrived
+        if not searching.any():
+            break
+        grown = reach.copy()
+        grown[:, size:] |= reach[:, :-size] & open_s[:, :-size]
+        grown[:, :-size] |= reach[:, size:] & open_n[:, size:]
+        grown[:, 1:] |= reach[:, :-1] & open_e[:, :-1]
+        grown[:, :-1] |= reach[:, 1:] & open_w[:, 1:]
+        # Searches that stopped growing never reach the goal
+        searching &= (grown != reach).any(axis=1)
+        reach = grown
+    return np.stack([distances[:count], distances[count:]], axis=1)
+
+
+def pawn_action_mask(state: q_state.QuoridorState) -> np.ndarray:
+    """Legality of every pawn action of DEFAULT_QUORIDOR_ACTION_LIBRARY, in PAWN_ACTION_INDICES order"""
+    blocked = unpack_bits(state.blocked | 1 << CLOSED_EDGE, EDGE_BYTES)
+    cell = state.agent_cell(state.agent_to_move)
+    opponent = state.agent_cell(1 - state.agent_to_move)
+    tables = PAWN_TABLES
+    occupancy_ok = np.where(tables["is_move"], tables["target"][:, cell] != opponent, tables["midway"][:, cell] == opponent)
+    return (occupancy_ok
+            & ~blocked[tables["open1"][:, cell]]
+            & ~blocked[tables["open2"][:, cell]]
+            & blocked[tables["closed"][:, cell]])
+
+
+def wall_action_mask(state: q_state.QuoridorState) -> np.ndarray:
+    """Legality of every wall action of DEFAULT_QUORIDOR_ACTION_LIBRARY, in WALL_ACTION_INDICES order"""
+    return unpack_bits(state.legal_walls(), WALL_BYTES)[WALL_TABLES["index"]]
+
+
+def legal_action_mask(state: q_state.QuoridorState) -> np.ndarray:
+    """Boolean mask over DEFAULT_QUORIDOR_ACTION_LIBRARY of the actions applicable in this state"""
+    mask = np.zeros(len(DEFAULT_QUORIDOR_ACTION_LIBRARY), dtype=bool)
+    mask[PAWN_ACTION_INDICES] = pawn_action_mask(state)
+    mask[WALL_ACTION_INDICES] = wall_action_mask(state)
+    return mask
+
+
+def legal_action_indices(state: q_state.QuoridorState) -> np.ndarray:
+    """Indices into DEFAULT_QUORIDOR_ACTION_LIBRARY of the actions applicable in this state"""
+    return np.flatnonzero(legal_action_mask(state))
+
+
+def random_legal_action_id(state: q_state.QuoridorState, rng) -> int:
+    """The id of an applicable action picked uniformly with rng (random.Random or the random module)"""
+    legal_indices = legal_action_indices(state)
+    return legal_indices[rng.randint(0, len(legal_indices) - 1)]
+
+
+def legal_actions(state: q_state.QuoridorState) -> list:
+    """Same result as state.get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY), computed from the mask"""
+    return [DEFAULT_QUORIDOR_ACTION_LIBRARY[i] for i in legal_action_indices(state)]
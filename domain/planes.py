@@ -0,0 +1,61 @@
+"""
+Fixed-shape array encoding of states, for training data and learned evaluators.
+
+encode(state) returns a (NUM_PLANES, SIZE, SIZE) uint8 array indexed [plane, y, x]:
+the two pawns, the horizontal and vertical walls (each wall marked at its slot, so row and column SIZE - 1
+stay empty), each agent's walls left repeated over the whole plane, and a plane of ones when agent 1 is to move.
+"""
+from __future__ import annotations
+import numpy as np
+from . import board
+from . import state as q_state
+from .movegen import unpack_bits
+
+PAWN_PLANES = (0, 1)
+HORIZONTAL_WALL_PLANE = 2
+VERTICAL_WALL_PLANE = 3
+WALLS_LEFT_PLANES = (4, 5)
+SIDE_TO_MOVE_PLANE = 6
+NUM_PLANES = 7
+SHAPE = (NUM_PLANES, board.SIZE, board.SIZE)
+
+WALL_SLOT_BYTES = (board.WALL_SLOTS + 7) // 8
+
+
+def encode(state: q_state.QuoridorState, out: np.ndarray = None) -> np.ndarray:
+    """The planes of state, written into `out` (a zeroed or reused array of shape SHAPE) when given"""
+    if out is None:
+        out = np.zeros(SHAPE, dtype=np.uint8)
+    else:
+        out.fill(0)
+    for agent_index in range(2):
+        y, x = divmod(state.agent_cell(agent_index), board.SIZE)
+        out[PAWN_PLANES[agent_index], y, x] = 1
+        out[WALLS_LEFT_PLANES[agent_index]] = state.walls_left[agent_index]
+    for plane, walls in ((HORIZONTAL_WALL_PLANE, state.horizontal_walls), (VERTICAL_WALL_PLANE, state.vertical_walls)):
+        if walls:
+            out[plane, :board.WALL_SIZE, :board.WALL_SIZE] = unpack_bits(walls, WALL_SLOT_BYTES)[:board.WALL_SLOTS].reshape(
+                board.WALL_SIZE, board.WALL_SIZE)
+    if state.agent_to_move:
+        out[SIDE_TO_MOVE_PLANE] = 1
+    return out
+
+
+def encode_batch(states: list[q_state.QuoridorState]) -> np.ndarray:
+    planes = np.zeros((len(states),) + SHAPE, dtype=np.uint8)
+    for i, state in enumerate(states):
+        encode(state, planes[i])
+    return planes
+
+
+def decode(planes: np.ndarray) -> q_state.QuoridorState:
+    """The state encoded by planes; the inverse of encode() apart from the parent and history"""
+    cells = [int(np.flatnonzero(planes[PAWN_PLANES[agent_index]])[0]) for agent_index in range(2)]
+    wall_positions = []
+    for plane, orientation in ((HORIZONTAL_WALL_PLANE, "h"), (VERTICAL_WALL_PLANE, "v")):
+        for y, x in zip(*np.nonzero(planes[plane])):
+            wall_positions.append(((int(x), int(y)), orientation))
+    agent_positions = [(board.cell_position(cell), q_state.AGENT_CHARS[i]) for i, cell in enumerate(cells)]
+    walls_left = (int(planes[WALLS_LEFT_PLANES[0], 0, 0]), int(planes[WALLS_LEFT_PLANES[1], 0, 0]))
+    return q_state.QuoridorState.from_positions(agent_positions, wall_positions,
+                                                int(planes[SIDE_TO_MOVE_PLANE, 0, 0]), walls_left)
@@ -0,0 +1,171 @@
+"""
+Exact solver for pawn races: positions where neither agent has walls left, so the board can no longer change.
+
+For a fixed wall layout the game has only 2 * CELLS * CELLS positions (side to move, both pawn cells),
+so they are all solved at once by retrograde analysis, jumps included, and the table is cached per layout.
+Positions that neither agent can force a win from (the pawns can block each other forever) are draws.
+"""
+from __future__ import annotations
+import functools
+from typing import NamedTuple
+import numpy as np
+from . import actions
+from . import board
+from . import movegen
+from . import state as q_state
+
+WIN = 1
+LOSS = -1
+DRAW = 0
+
+POSITIONS = 2 * board.CELLS * board.CELLS
+PAWN_ACTIONS = [actions.DEFAULT_QUORIDOR_ACTION_LIBRARY[i] for i in movegen.PAWN_ACTION_INDICES]
+
+
+class RaceResult(NamedTuple):
+    # 1 or 2 like QuoridorState.get_winner, None for a draw
+    winner: int
+    # Plies until the game ends with best play: the winner wins as fast as it can, the loser holds out as long as it can
+    plies: int
+    # The best move for the agent to move, None if the game is over
+    action: actions.AnyAction
+
+
+def position_index(agent_to_move: int, cell0: int, cell1: int) -> int:
+    return (agent_to_move * board.CELLS + cell0) * board.CELLS + cell1
+
+
+@functools.lru_cache(maxsize=None)
+def _move_graph():
+    """
+    Every pawn move that the pawn cells alone allow, whatever the walls, as flat arrays over moves:
+    source position, destination position and the three blocked bits that decide whether the move is
+    applicable (the same open1/open2/closed test as movegen.PAWN_TABLES), plus for every position the
+    moves leading into it, as a (POSITIONS, max predecessors) array padded with -1.
+    Only which of these moves the walls allow changes from one layout to the next.
+    """
+    tables = movegen.PAWN_TABLES
+    cells = np.arange(board.CELLS)
+    # possible[action, mover cell, opponent cell]
+    possible = np.where(tables["is_move"][:, None, None],
+                        tables["target"][:, :, None] != cells,
+                        tables["midway"][:, :, None] == cells)
+    # Targets off the board only come from moves that the border blocks anyway
+    possible &= ((tables["target"] >= 0) & (tables["target"] < board.CELLS))[:, :, None]
+    action, mover, opponent = np.nonzero(possible)
+    target = tables["target"][action, mover].astype(np.int64)
+    edges = np.stack([tables[name][action, mover] for name in ["open1", "open2", "closed"]]).astype(np.int32)
+    # Agent 0 moving from (mover, opponent) leads to agent 1 to move at (target, opponent), and the mirror for agent 1
+    source = np.concatenate([position_index(0, mover, opponent), position_index(1, opponent, mover)])
+    destination = np.concatenate([position_index(1, target, opponent), position_index(0, opponent, target)])
+    edges = np.concatenate([edges, edges], axis=1)
+
+    order = np.argsort(destination, kind="stable")
+    counts = np.bincount(destination, minlength=POSITIONS)
+    rank = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+    predecessors = np.full((POSITIONS, counts.max()), -1, dtype=np.int32)
+    predecessors[destination[order], rank] = order
+    return source.astype(np.int32), destination.astype(np.int32), edges, predecessors
+
+
+@functools.lru_cache(maxsize=None)
+def _terminal_positions():
+    """Values and plies of the finished positions, and which unfinished positions can occur at all"""
+    side, cell0, cell1 = np.unravel_index(np.arange(POSITIONS), (2, board.CELLS, board.CELLS))
+    winner = np.where(cell0 // board.SIZE == board.GOAL_ROWS[0], 0,
+                      np.where(cell1 // board.SIZE == board.GOAL_ROWS[1], 1, -1))
+    terminal = winner >= 0
+    values = np.zeros(POSITIONS, dtype=np.int8)
+    values[terminal] = np.where(winner[terminal] == side[terminal], WIN, LOSS)
+    plies = np.where(terminal, 0, -1).astype(np.int16)
+    # Both pawns on one cell never happens in a game
+    return values, plies, np.flatnonzero(terminal), ~terminal & (cell0 != cell1)
+
+
+@functools.lru_cache(maxsize=64)
+def solve_layout(blocked: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Values (WIN, LOSS or DRAW for the agent to move) and plies to the end of every position with these walls,
+    indexed by position_index. Found by retrograde analysis in rounds: a position is won in round k if a move
+    leads to a position lost in round k - 1, and lost in round k once every move leads to a position won in an
+    earlier round, so k is its number of plies. Each round only looks at the predecessors of the last round.
+    """
+    source, destination, edges, predecessors = _move_graph()
+    terminal_values, terminal_plies, frontier, can_occur = _terminal_positions()
+    bits = movegen.unpack_bits(blocked | 1 << movegen.CLOSED_EDGE, movegen.EDGE_BYTES)
+    allowed = ~bits[edges[0]] & ~bits[edges[1]] & bits[edges[2]]
+    # Moves not yet known to lead to a won position: a position is lost once this drops to 0
+    open_moves = np.bincount(source[allowed], minlength=POSITIONS)
+    values = terminal_values.copy()
+    plies = terminal_plies.copy()
+    # A pawn without moves is stuck rather than lost, so such positions are left as draws
+    solvable = can_occur & (open_moves > 0)
+
+    rounds = 0
+    while len(frontier):
+        rounds += 1
+        moves = predecessors[frontier].ravel()
+        moves = moves[moves >= 0]
+        moves = moves[allowed[moves] & solvable[source[moves]]]
+        sources = source[moves]
+        into_lost = values[destination[moves]] == LOSS
+        won = np.zeros(POSITIONS, dtype=bool)
+        won[sources[into_lost]] = True
+        ruled_out = sources[~into_lost]
+        open_moves -= np.bincount(ruled_out, minlength=POSITIONS)
+        lost = np.zeros(POSITIONS, dtype=bool)
+        lost[ruled_out[open_moves[ruled_out] == 0]] = True
+        lost &= ~won
+        values[won] = WIN
+        values[lost] = LOSS
+        frontier = np.flatnonzero(won | lost)
+        plies[frontier] = rounds
+        solvable[frontier] = False
+    return values, plies
+
+
+def is_race(state: q_state.QuoridorState) -> bool:
+    return state.walls_left[0] == 0 and state.walls_left[1] == 0
+
+
+def outcome(state: q_state.QuoridorState) -> tuple[int, int]:
+    """WIN, LOSS or DRAW for the agent to move and the plies to the end, without looking for the best move"""
+    if not is_race(state):
+        raise ValueError("the race solver needs both agents to be out of walls")
+    values, plies = solve_layout(state.blocked)
+    index = position_index(state.agent_to_move, state.agent_cell(0), state.agent_cell(1))
+    return int(values[index]), int(plies[index])
+
+
+def _winner(agent_to_move: int, value: int) -> int:
+    return None if value == DRAW else (agent_to_move if value == WIN else 1 - agent_to_move) + 1
+
+
+def winner(state: q_state.QuoridorState) -> int:
+    """solve(state).winner, without looking for the best move"""
+    value, _ = outcome(state)
+    return _winner(state.agent_to_move, value)
+
+
+def solve(state: q_state.QuoridorState) -> RaceResult:
+    """The exact result of a position in which neither agent has walls left"""
+    value, position_plies = outcome(state)
+    values, plies = solve_layout(state.blocked)
+    me = state.agent_to_move
+    winner = _winner(me, value)
+    if state.is_terminal():
+        return RaceResult(winner, 0, None)
+
+    best_action = None
+    best_rank = None
+    for action in PAWN_ACTIONS:
+        if not action.is_applicable(me, state):
+            continue
+        cell = state.agent_cell(me) + action.step
+        next_index = position_index(1 - me, cell, state.agent_cell(1)) if me == 0 else position_index(1 - me, state.agent_cell(0), cell)
+        # Prefer moves that leave the opponent lost, then drawn, then won; win fast and lose slowly
+        next_value = values[next_index]
+        rank = (-next_value, -plies[next_index] if next_value == LOSS else plies[next_index])
+        if best_rank is None or rank > best_rank:
+            best_action, best_rank = action, rank
+    return RaceResult(winner, None if value == DRAW else position_plies, best_action)
@@ -0,0 +1,166 @@
+"""
+A compact binary format for game records.
+
+A file starts with MAGIC and is followed by any number of records, so games can be appended to it forever.
+Each record is a fixed header (winner, number of actions, metadata length), the metadata as UTF-8 JSON and
+then one byte per action: its index in DEFAULT_QUORIDOR_ACTION_LIBRARY (16 pawn actions and 128 walls).
+Every game starts from initial_state. A typical random game takes a few hundred bytes, a played one under 100.
+
+    with RecordWriter("games.qrec") as writer:
+        writer.write_state(final_state, {"agents": ["mcts", "alphabeta"]})
+
+    for record in RecordReader("games.qrec"):
+        final_state = record.replay()
+"""
+from __future__ import annotations
+import json
+import struct
+from typing import Iterator, NamedTuple
+from . import actions
+from . import state as q_state
+
+MAGIC = b"QREC\x01"
+# winner (0 if the game did not finish, else 1 or 2), number of actions, metadata length
+HEADER = struct.Struct("<BIH")
+
+
+def encode_action(action: actions.AnyAction) -> int:
+    """The action's id, which is its index in DEFAULT_QUORIDOR_ACTION_LIBRARY"""
+    return action.id
+
+
+def decode_action(code: int) -> actions.AnyAction:
+    return actions.DEFAULT_QUORIDOR_ACTION_LIBRARY[code]
+
+
+class GameRecord(NamedTuple):
+    moves: bytes
+    winner: int = 0
+    # None when the record has no metadata
+    metadata: dict = None
+
+    @classmethod
+    def from_state(cls, state: q_state.QuoridorState, metadata: dict = None) -> GameRecord:
+        """
+        The record of the game that led from initial_state to state. The state must know every action of the game
+        (a parent chain or detached_copy(keep_action_log=True) from initial_state), otherwise QuoridorState.history()
+        raises ValueError; callers that only kept the actions use write_actions instead.
+        """
+        winner = state.get_winner() if state.is_terminal() else 0
+        return cls(bytes(encode_action(action) for action in state.history()), winner, metadata or None)
+
+    def actions(self) -> list[actions.AnyAction]:
+        return [decode_action(code) for code in self.moves]
+
+    def states(self, check: bool = True) -> Iterator[q_state.QuoridorState]:
+        """Replays the game, yielding initial_state and every state after it; check=True rejects illegal actions"""
+        state = q_state.initial_state.detached_copy()
+        yield state
+        for action in self.actions():
+            if check and not state.is_applicable(action):
+                raise ValueError("%s is not applicable after %i actions" % (action, state.path_cost))
+            state = state.result(action)
+            yield state
+
+    def replay(self, check: bool = True) -> q_state.QuoridorState:
+        """The final position of the game"""
+        state = q_state.initial_state.detached_copy()
+        for action in self.actions():
+            if check and not state.is_applicable(action):
+                raise ValueError("%s is not applicable after %i actions" % (action, state.path_cost))
+            state.apply(action, undoable=False)
+        return state
+
+    def to_bytes(self) -> bytes:
+        metadata = json.dumps(self.metadata, separators=(",", ":")).encode() if self.metadata else b""
+        return HEADER.pack(self.winner, len(self.moves), len(metadata)) + metadata + bytes(self.moves)
+
+
+class RecordWriter:
+    """
+    Appends records to a file, writing MAGIC first if the file is new or empty.
+    Accepts a path or a binary file object; only files it opened itself are closed by close().
+    """
+
+    def __init__(self, file):
+        self.owns_file = isinstance(file, (str, bytes)) or hasattr(file, "__fspath__")
+        self.file = open(file, "ab") if self.owns_file else file
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.records_written = 0
+
+    def write(self, record: GameRecord):
+        self.file.write(record.to_bytes())
+        self.records_written += 1
+
+    def write_actions(self, game_actions: list[actions.AnyAction], winner: int = 0, metadata: dict = None):
+        self.write(GameRecord(bytes(encode_action(action) for action in game_actions), winner, metadata or None))
+
+    def write_state(self, state: q_state.QuoridorState, metadata: dict = None):
+        self.write(GameRecord.from_state(state, metadata))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self) -> RecordWriter:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordReader:
+    """
+    Iterates over the records of a file one at a time, so files of any size can be read in constant memory.
+    Accepts a path or a binary file object positioned at the start of the file.
+    """
+
+    def __init__(self, file):
+        self.owns_file = isinstance(file, (str, bytes)) or hasattr(file, "__fspath__")
+        self.file = open(file, "rb") if self.owns_file else file
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a game record file")
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = self.file.read(size)
+        if len(data) != size:
+            raise ValueError("the file ends in the middle of a record")
+        return data
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        while True:
+            header = self.file.read(HEADER.size)
+            if not header:
+                return
+            if len(header) != HEADER.size:
+                raise ValueError("the file ends in the middle of a record")
+            winner, num_actions, metadata_length = HEADER.unpack(header)
+            metadata = json.loads(self._read_exactly(metadata_length)) if metadata_length else None
+            yield GameRecord(self._read_exactly(num_actions), winner, metadata)
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self) -> RecordReader:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_records(path: str, records):
+    with RecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+
+
+def read_records(path: str) -> Iterator[GameRecord]:
+    with RecordReader(path) as reader:
+        yield from reader
@@ -1,112 +1,257 @@
 from __future__ import annotations
-import networkx as nx
-import copy
-import domain.actions as actions
+from . import actions
+from . import board
+from . import distances
+from . import walls
+from . import zobrist
 
-def findVertice(graph, position: tuple[int, int]):
-        return [x for x,y in graph.nodes(data=True) if y['pos'] == position][0]
+AGENT_CHARS = ("1", "2")
 
 class QuoridorState:
 
+    __slots__ = ('pawns', 'horizontal_walls', 'vertical_walls', 'blocked', 'agent_to_move', 'walls_left', 'key',
+                 'placeable_walls',
+                 'parent', 'action_taken_to_state', 'path_cost', 'detached', 'action_log',
+                 '_blocking_walls', '_distance_maps', '_undo_stack')
+
     def __init__(
         self,
-        agent_positions: list[tuple[tuple[int, int], str]],
-        wall_positions: list[tuple[tuple[int, int], str]],
+        pawns: int,
+        horizontal_walls: int,
+        vertical_walls: int,
+        blocked: int,
         agent_to_move: int,
         walls_left: tuple[int, int],
-        nxgraph: nx.Graph,
         action: actions.AnyAction = None,
         parent = None,
+        key: int = None,
+        placeable_walls: int = None,
     ):
-        self.agent_positions = agent_positions
-        self.wall_positions = wall_positions
+        """
+        The board is stored as a handful of ints, see domain.board for the bit layout:
+        pawns packs both agents' cells, horizontal_walls/vertical_walls have one bit per wall slot
+        and blocked has one bit per (cell, direction) edge that is cut by a wall or the border.
+        key is the position's Zobrist key and placeable_walls has a bit per wall id (see board.wall_id) that
+        still fits between the walls on the board; both are computed from scratch only when not given.
+        """
+        self.pawns = pawns
+        self.horizontal_walls = horizontal_walls
+        self.vertical_walls = vertical_walls
+        self.blocked = blocked
         self.agent_to_move = agent_to_move
         self.walls_left = walls_left
-        self.graph = nxgraph
         self.parent = parent
         self.action_taken_to_state = action
         self.path_cost = 0 if parent is None else parent.path_cost + 1
+        self.key = key if key is not None else zobrist.full_key(pawns, horizontal_walls, vertical_walls,
+                                                                  agent_to_move, walls_left)
+        self.placeable_walls = (placeable_walls if placeable_walls is not None
+                                else board.placeable_walls(horizontal_walls, vertical_walls))
+        # Detached states do not link to their parent, see detached()
+        self.detached = False
+        self.action_log = None
+        self._blocking_walls = None
+        # Per agent goal-distance maps, filled in lazily and shared with states that have the same walls
+        self._distance_maps = (None, None)
+        self._undo_stack = None
+
+    @classmethod
+    def from_positions(cls, agent_positions: list[tuple[tuple[int, int], str]],
+                       wall_positions: list[tuple[tuple[int, int], str]],
+                       agent_to_move: int, walls_left: tuple[int, int]) -> QuoridorState:
+        """Builds a state from (x, y) coordinates, the same format agent_positions and wall_positions return"""
+        pawns = board.pack_pawns(board.cell_index(agent_positions[0][0]), board.cell_index(agent_positions[1][0]))
+        horizontal_walls = vertical_walls = 0
+        blocked = board.BORDER_BLOCKED
+        for position, orientation in wall_positions:
+            slot = board.wall_slot(position)
+            if orientation == "v":
+                vertical_walls |= 1 << slot
+            else:
+                horizontal_walls |= 1 << slot
+            blocked |= board.WALL_CUTS[orientation][slot]
+        return cls(pawns, horizontal_walls, vertical_walls, blocked, agent_to_move, tuple(walls_left))
+
+    def agent_cell(self, agent_index: int) -> int:
+        return self.pawns >> board.PAWN_SHIFT[agent_index] & board.PAWN_MASK
+
+    @property
+    def agent_positions(self) -> list[tuple[tuple[int, int], str]]:
+        return [(board.cell_position(self.agent_cell(i)), AGENT_CHARS[i]) for i in range(2)]
+
+    @property
+    def wall_positions(self) -> list[tuple[tuple[int, int], str]]:
+        walls = []
+        for slot in range(board.WALL_SIZE * board.WALL_SIZE):
+            if self.vertical_walls >> slot & 1:
+                walls.append((board.wall_position(slot), "v"))
+            elif self.horizontal_walls >> slot & 1:
+                walls.append((board.wall_position(slot), "h"))
+        return walls
 
     def free_at(self, position: tuple[int, int]) -> bool:
-        for pos2, char in self.agent_positions:
-            if pos2 == position:
-                return False
-        return True
-    
+        cell = board.cell_index(position)
+        return cell != self.agent_cell(0) and cell != self.agent_cell(1)
+
     def not_blocked_by_wall(self, position: tuple[int, int], dir: str) -> bool:
-        x, y = position
-        for wall_pos, orientation in self.wall_positions:
-            if orientation == "v":
-                if dir == "e" and wall_pos[0] == x and (wall_pos[1] == y or wall_pos[1] == y - 1):
-                    return False
-                if dir == "w" and wall_pos[0] == x - 1 and (wall_pos[1] == y or wall_pos[1] == y - 1):
-                    return False
-            if dir == "n" and wall_pos[1] == y - 1 and (wall_pos[0] == x or wall_pos[0] == x - 1):
-                return False
-            if dir == "s" and wall_pos[1] == y and (wall_pos[0] == x or wall_pos[0] == x - 1):
-                return False
-        return True
+        return not self.blocked >> (board.DIRECTION_SHIFT[dir.upper()] + board.cell_index(position)) & 1
 
     def wall_at(self, position: tuple[int, int]) -> bool:
-        for pos, _ in self.wall_positions:
-            if pos == position:
-                return True
-        return False
-    
+        return bool((self.horizontal_walls | self.vertical_walls) >> board.wall_slot(position) & 1)
+
     def wall_and_orientation_at(self, position: tuple[int, int], orientation: str) -> bool:
-        for pos, ori in self.wall_positions:
-            if pos == position and ori == orientation:
-                return True
-        return False
-    
-    def findVertice(self, position: tuple[int, int]):
-        return findVertice(self.graph, position)
+        if not board.wall_in_bounds(position):
+            return False
+        walls = self.vertical_walls if orientation == "v" else self.horizontal_walls
+        return bool(walls >> board.wall_slot(position) & 1)
+
+    def blocking_walls(self) -> tuple[int, int]:
+        """(vertical, horizontal) slot masks of the walls that would cut an agent off, computed once per state"""
+        if self._blocking_walls is None:
+            self._blocking_walls = walls.blocking_walls(self)
+        return self._blocking_walls
+
+    def legal_walls(self) -> int:
+        """Wall ids the agent to move may place: they fit on the board and cut no pawn off"""
+        if self.walls_left[self.agent_to_move] < 1:
+            return 0
+        vertical, horizontal = self.blocking_walls()
+        return self.placeable_walls & ~(vertical << board.WALL_ID_OFFSET["v"] | horizontal << board.WALL_ID_OFFSET["h"])
+
+    def distance_map(self, agent_index: int) -> list[int]:
+        """Shortest number of steps from every cell to the agent's goal row (distances.UNREACHABLE if cut off)"""
+        maps = self._distance_maps
+        if maps[agent_index] is None:
+            new_map = distances.distance_map(board.GOAL_MASKS[agent_index], self.blocked)
+            maps = (new_map, maps[1]) if agent_index == 0 else (maps[0], new_map)
+            self._distance_maps = maps
+        return maps[agent_index]
+
+    def distance_to_goal(self, agent_index: int) -> int:
+        """Shortest number of steps from the agent's pawn to its goal row, ignoring the other pawn"""
+        return self.distance_map(agent_index)[self.agent_cell(agent_index)]
 
     def wall_blocks(self, position: tuple[int, int], orientation: str) -> bool:
-        copyGraph = self.graph.copy()
-        cutVertices = [[findVertice(copyGraph, position), findVertice(copyGraph, actions.pos_add(position, actions.cutDict[orientation][0]))], [findVertice(copyGraph, actions.pos_add(position, (1,1))), findVertice(copyGraph, actions.pos_add(position, actions.cutDict[orientation][1]))]]
-        deleted_edges = False
-        for vpair in cutVertices:
-            if copyGraph.has_edge(vpair[0], vpair[1]):
-                deleted_edges = True
-                copyGraph.remove_edge(vpair[0], vpair[1])
-        p1_node = findVertice(copyGraph, self.agent_positions[0][0])
-        p2_node = findVertice(copyGraph, self.agent_positions[1][0])
-        p1_goal = findVertice(copyGraph, (-1, -1))
-        p2_goal = findVertice(copyGraph, (-2, -2))
-        copyGraph.remove_node(p2_goal)
-        if not nx.has_path(copyGraph, p1_node, p1_goal):
-            return True
-        copyGraph.add_node(p2_goal, pos = (-2, -2))
-        copyGraph.remove_node(p1_goal)
-        for i in range(9):
-            copyGraph.add_edge(p2_goal, findVertice(copyGraph, (i, 0)))
-        if not nx.has_path(copyGraph, p2_node, p2_goal):
-            return True
-        return False
-    
+        vertical, horizontal = self.blocking_walls()
+        return bool((vertical if orientation == "v" else horizontal) >> board.wall_slot(position) & 1)
+
     def result(self, action: actions.AnyAction):
         """Computes the state resulting from applying a joint action to this state"""
-        new_state = QuoridorState(copy.copy(self.agent_positions), copy.copy(self.wall_positions),
-                                  copy.copy(self.agent_to_move), copy.copy(self.walls_left),
-                                  copy.copy(self.graph), action, self)
+        if self.detached:
+            new_state = QuoridorState(self.pawns, self.horizontal_walls, self.vertical_walls, self.blocked,
+                                      self.agent_to_move, self.walls_left, action, None, self.key, self.placeable_walls)
+            new_state.path_cost = self.path_cost + 1
+            new_state.detached = True
+            if self.action_log is not None:
+                new_state.action_log = (action, self.action_log)
+        else:
+            new_state = QuoridorState(self.pawns, self.horizontal_walls, self.vertical_walls, self.blocked,
+                                      self.agent_to_move, self.walls_left, action, self, self.key, self.placeable_walls)
+        new_state._distance_maps = self._distance_maps
 
         action.result(self.agent_to_move, new_state)
         return new_state
 
+    def detached_copy(self, keep_action_log: bool = False) -> QuoridorState:
+        """
+        A copy that does not keep its parent alive, and neither will any state reached from it by result().
+        path_cost keeps counting. With keep_action_log=True the actions taken from here on are recorded
+        as a chain of (action, previous log) pairs instead of full parent states, see history().
+        """
+        new_state = QuoridorState(self.pawns, self.horizontal_walls, self.vertical_walls, self.blocked,
+                                  self.agent_to_move, self.walls_left, self.action_taken_to_state, None, self.key,
+                                  self.placeable_walls)
+        new_state.path_cost = self.path_cost
+        new_state.detached = True
+        new_state.action_log = () if keep_action_log else None
+        new_state._distance_maps = self._distance_maps
+        return new_state
+
+    def history(self) -> list[actions.AnyAction]:
+        """
+        The actions that led to this state, from the action log if there is one, otherwise from the parent chain.
+        Raises ValueError when they do not cover the whole game (path_cost actions): a detached state without
+        a log, a log started mid-game, or a parent chain that apply() moved past in place.
+        """
+        history = []
+        if self.action_log is not None:
+            log = self.action_log
+            while log:
+                history.append(log[0])
+                log = log[1]
+        else:
+            state = self
+            while state.parent is not None:
+                history.append(state.action_taken_to_state)
+                state = state.parent
+        if len(history) != self.path_cost:
+            raise ValueError("only %i of the %i actions that led to this state are known" %
+                             (len(history), self.path_cost))
+        history.reverse()
+        return history
+
+    def apply(self, action: actions.AnyAction, undoable: bool = True):
+        """
+        Applies the action to this state in place instead of allocating a new state.
+        With undoable=True the previous board is pushed on a stack so that undo() restores it exactly;
+        rollouts that never go back can pass undoable=False and skip the bookkeeping.
+        """
+        if undoable:
+            if self._undo_stack is None:
+                self._undo_stack = []
+            self._undo_stack.append((self.pawns, self.horizontal_walls, self.vertical_walls, self.blocked,
+                                     self.agent_to_move, self.walls_left, self.key, self.placeable_walls,
+                                     self._blocking_walls, self._distance_maps))
+        action.result(self.agent_to_move, self)
+        self._blocking_walls = None
+        self.path_cost += 1
+        if self.action_log is not None:
+            self.action_log = (action, self.action_log)
+
+    def undo(self):
+        """Reverts the most recent undoable apply()"""
+        (self.pawns, self.horizontal_walls, self.vertical_walls, self.blocked,
+         self.agent_to_move, self.walls_left, self.key, self.placeable_walls,
+         self._blocking_walls, self._distance_maps) = self._undo_stack.pop()
+        self.path_cost -= 1
+        if self.action_log is not None:
+            self.action_log = self.action_log[1]
+
     def copy(self):
         """Computes the state resulting from applying a joint action to this state"""
-        new_state = QuoridorState(copy.copy(self.agent_positions), copy.copy(self.wall_positions),
-                                  copy.copy(self.agent_to_move), copy.copy(self.walls_left),
-                                  copy.copy(self.graph), self.action_taken_to_state, self.parent)
+        new_state = QuoridorState(self.pawns, self.horizontal_walls, self.vertical_walls, self.blocked,
+                                  self.agent_to_move, self.walls_left, self.action_taken_to_state, self.parent,
+                                  self.key, self.placeable_walls)
+        new_state.path_cost = self.path_cost
+        new_state.detached = self.detached
+        new_state.action_log = self.action_log
+        new_state._distance_maps = self._distance_maps
         return new_state
-    
+
     def is_applicable(self, action: actions.AnyAction) -> bool:
         """Returns whether all individual actions in the joint_action is applicable in this state"""
         if not action.is_applicable(self.agent_to_move, self):
             return False
         return True
 
+    def is_legal(self, action_id: int) -> bool:
+        """
+        Whether the agent to move may play the library action with this id (see actions.parse_action_id),
+        the same answer as is_applicable but checking only this action: a wall costs two flood fills
+        unless the state already knows its blocking walls.
+        """
+        library = actions.DEFAULT_QUORIDOR_ACTION_LIBRARY
+        if not 0 <= action_id < len(library):
+            return False
+        action = library[action_id]
+        if not isinstance(action, actions.WallAction) or self._blocking_walls is not None:
+            return action.is_applicable(self.agent_to_move, self)
+        if self.walls_left[self.agent_to_move] < 1 or not self.placeable_walls >> action.wall_id & 1:
+            return False
+        blocked = self.blocked | action.cut
+        return (board.has_path(self.agent_cell(0), board.GOAL_MASKS[0], blocked)
+                and board.has_path(self.agent_cell(1), board.GOAL_MASKS[1], blocked))
+
     def get_applicable_actions(self, action_set: list[actions.AnyAction]) -> list[actions.AnyAction]:
         """Returns a list of all applicable joint_action in this state"""
         # Determine all applicable actions for each individual agent, i.e. without consideration of conflicts.
@@ -115,92 +260,78 @@ class QuoridorState:
             if action.is_applicable(self.agent_to_move, self):
                 applicable_actions.append(action)
         return applicable_actions
-    
+
     def is_terminal(self):
-        if self.agent_positions[0][0][1] == 8:
+        if self.agent_cell(0) // board.SIZE == board.GOAL_ROWS[0]:
             return True
-        if self.agent_positions[1][0][1] == 0:
+        if self.agent_cell(1) // board.SIZE == board.GOAL_ROWS[1]:
             return True
         return False
-    
+
     def get_winner(self):
-        if self.agent_positions[0][0][1] == 8:
+        if self.agent_cell(0) // board.SIZE == board.GOAL_ROWS[0]:
             return 1
-        if self.agent_positions[1][0][1] == 0:
+        if self.agent_cell(1) // board.SIZE == board.GOAL_ROWS[1]:
             return 2
         return None
-    
+
     def __repr__(self) -> str:
-        board = []
-        flatline = ["-" for i in range(19)]
-        board.append(flatline)
+        board_lines = []
+        flatline = ["-" for i in range(2 * board.SIZE + 1)]
+        board_lines.append(flatline)
+        agent_positions = self.agent_positions
         # Add the grid and the players to the list of strings
-        for y in range(9):
+        for y in range(board.SIZE):
             line = []
-            for x in range(9):
+            for x in range(board.SIZE):
                 line.append("|")
-                if (x, y) == self.agent_positions[0][0]:
-                    line.append(self.agent_positions[0][1])
-                elif (x, y) == self.agent_positions[1][0]:
-                    line.append(self.agent_positions[1][1])
+                if (x, y) == agent_positions[0][0]:
+                    line.append(agent_positions[0][1])
+                elif (x, y) == agent_positions[1][0]:
+                    line.append(agent_positions[1][1])
                 else:
                     line.append(" ")
             line.append("|")
-            board.append(line)
-            board.append(flatline.copy())
+            board_lines.append(line)
+            board_lines.append(flatline.copy())
         # Add the walls
         for wall in self.wall_positions:
             x, y = wall[0]
-            board[(y+1)*2][(x+1)*2] = '#'
+            board_lines[(y+1)*2][(x+1)*2] = '#'
             if wall[1] == "v":
-                board[(y+1)*2-1][(x+1)*2] = '#'
-                board[(y+2)*2-1][(x+1)*2] = '#'
+                board_lines[(y+1)*2-1][(x+1)*2] = '#'
+                board_lines[(y+2)*2-1][(x+1)*2] = '#'
             else:
-                board[(y+1)*2][(x+1)*2-1] = '#'
-                board[(y+1)*2][(x+2)*2-1] = '#'
-        board.append(f"{self.agent_to_move}|({self.walls_left})")
-        board = [''.join(linei) for linei in board]
-        return '\n'.join(board)
+                board_lines[(y+1)*2][(x+1)*2-1] = '#'
+                board_lines[(y+1)*2][(x+2)*2-1] = '#'
+        board_lines.append(f"{self.agent_to_move}|({list(self.walls_left)})")
+        board_lines = [''.join(linei) for linei in board_lines]
+        return '\n'.join(board_lines)
 
     def __eq__(self, other) -> bool:
         """
-        Notice that we here only compare the agent positions and box positions, but ignore all other fields.
+        Notice that we here only compare the agent positions and wall positions, but ignore all other fields.
         That means that two states with identical positions but e.g. different parent will be seen as equal.
         """
         if isinstance(other, self.__class__):
-            return self.agent_positions == other.agent_positions and self.wall_positions == other.wall_positions and self.agent_to_move == other.agent_to_move and self.walls_left == other.walls_left
+            return (self.pawns == other.pawns and self.horizontal_walls == other.horizontal_walls
+                    and self.vertical_walls == other.vertical_walls and self.agent_to_move == other.agent_to_move
+                    and self.walls_left == other.walls_left)
         else:
             return False
-        
+
     def __ne__(self, other) -> bool:
         return not self.__eq__(other)
-    
+
     def __hash__(self):
         """
         Allows the state to be stored in a hash table for efficient lookup.
-        Notice that we here only hash the agent positions and box positions, but ignore all other fields.
+        Notice that we here only hash the agent positions, walls, walls left and agent to move, but ignore all other fields.
         That means that two states with identical positions but e.g. different parent will map to the same hash value.
         """
-        return hash((tuple(self.agent_positions), tuple(self.box_positions), self.agent_to_move, self.walls_left))
-    
-initial_graph = nx.Graph()
-ids = 0
-for x in range(9):
-    for y in range(9):
-        initial_graph.add_node(ids, pos=(x, y))
-        ids += 1
-for node1, data1 in initial_graph.nodes(data=True):
-    for node2, data2 in initial_graph.nodes(data=True):
-        if not initial_graph.has_edge(node1, node2) and abs(data1['pos'][0] - data2['pos'][0]) + abs(data1['pos'][1] - data2['pos'][1]) == 1:
-            initial_graph.add_edge(node1, node2)
-initial_graph.add_node(-1, pos=(-1, -1))
-initial_graph.add_node(-2, pos=(-2, -2))
-for i in range(9):
-    initial_graph.add_edge(-1, findVertice(initial_graph, (i, 8)))
-    initial_graph.add_edge(-2, findVertice(initial_graph, (i, 0)))
-
-initial_state = QuoridorState([((4,0),"1"), ((4,8),"2")],
-                              [],
-                              0,
-                              [10, 10],
-                              initial_graph)
\ No newline at end of file
+        return self.key
+
+initial_state = QuoridorState.from_positions([((board.SIZE // 2, 0), "1"), ((board.SIZE // 2, board.SIZE - 1), "2")],
+                                             [],
+                                             0,
+                                             (board.WALLS_PER_PLAYER, board.WALLS_PER_PLAYER))
@@ -0,0 +1,91 @@
+from __future__ import annotations
+import functools
+from . import board
+from . import state as q_state
+
+NO_PARENT = -1
+
+
+@functools.lru_cache(maxsize=4096)
+def _cut_analysis(goal_mask: int, blocked: int):
+    """
+    Builds a BFS spanning tree rooted at the goal row and gives every edge a cycle-space label:
+    each non-tree edge gets its fixed random label, and each tree edge gets the xor of the labels
+    of all non-tree edges that cross it. A tree edge with label 0 is a bridge, and two edges form
+    a cut exactly when their labels are equal (up to the negligible chance of a 64-bit collision).
+    Returns the tree parents, the blocked bit of each cell's tree edge and the tree edge labels
+    (keyed by the child cell). The tree only depends on the walls, so pawn moves reuse it from the cache.
+    """
+    parent = [NO_PARENT] * board.CELLS
+    parent_bit = [NO_PARENT] * board.CELLS
+    seen = goal_mask
+    order = [cell for cell in range(board.CELLS) if goal_mask >> cell & 1]
+    for cell in order:
+        for bit, other in board.NEIGHBOURS[cell]:
+            if not blocked >> bit & 1 and not seen >> other & 1:
+                seen |= 1 << other
+                parent[other] = cell
+                parent_bit[other] = bit
+                order.append(other)
+    subtree_label = [0] * board.CELLS
+    for cell in order:
+        for bit, other in board.NEIGHBOURS[cell]:
+            # Visit each non-tree edge once, from its lower cell
+            if other > cell and not blocked >> bit & 1 and parent[other] != cell and parent[cell] != other:
+                label = board.EDGE_LABELS[bit]
+                subtree_label[cell] ^= label
+                subtree_label[other] ^= label
+    for cell in reversed(order):
+        if parent[cell] != NO_PARENT:
+            subtree_label[parent[cell]] ^= subtree_label[cell]
+    return parent, parent_bit, subtree_label
+
+
+def _edge_info(edge: tuple[int, int, int], parent: list[int], subtree_label: list[int], blocked: int):
+    """Returns (child cell if the edge is a tree edge else None, label) for one edge of a wall"""
+    a, b, bit = edge
+    if parent[a] == b:
+        return a, subtree_label[a]
+    if parent[b] == a:
+        return b, subtree_label[b]
+    return None, 0 if blocked >> bit & 1 else board.EDGE_LABELS[bit]
+
+
+def blocking_walls(state: q_state.QuoridorState) -> tuple[int, int]:
+    """
+    Finds every wall slot that would cut some agent off from its goal row, as
+    (vertical slot mask, horizontal slot mask). This costs one spanning-tree traversal per agent;
+    only the few walls the cut analysis flags are confirmed with a flood fill.
+    """
+    candidates = {"v": 0, "h": 0}
+    blocked = state.blocked
+    for agent_index in range(2):
+        start = state.agent_cell(agent_index)
+        parent, parent_bit, subtree_label = _cut_analysis(board.GOAL_MASKS[agent_index], blocked)
+        path = set()
+        path_bits = []
+        cell = start
+        while parent[cell] != NO_PARENT:
+            path.add(cell)
+            path_bits.append(parent_bit[cell])
+            cell = parent[cell]
+        # The goal can only be cut off if the wall removes a tree edge on the agent's own path
+        for bit in path_bits:
+            for orientation, slot in board.EDGE_WALLS[bit]:
+                edge1, edge2 = board.WALL_EDGES[orientation][slot]
+                child1, label1 = _edge_info(edge1, parent, subtree_label, blocked)
+                child2, label2 = _edge_info(edge2, parent, subtree_label, blocked)
+                on_path1 = child1 is not None and child1 in path
+                on_path2 = child2 is not None and child2 in path
+                if (on_path1 and label1 == 0) or (on_path2 and label2 == 0) or label1 == label2:
+                    candidates[orientation] |= 1 << slot
+    blocking = {"v": 0, "h": 0}
+    for orientation in ["v", "h"]:
+        for slot in range(board.WALL_SIZE * board.WALL_SIZE):
+            if candidates[orientation] >> slot & 1:
+                cut_blocked = blocked | board.WALL_CUTS[orientation][slot]
+                for agent_index in range(2):
+                    if not board.has_path(state.agent_cell(agent_index), board.GOAL_MASKS[agent_index], cut_blocked):
+                        blocking[orientation] |= 1 << slot
+                        break
+    return blocking["v"], blocking["h"]
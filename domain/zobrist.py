@@ -0,0 +1,27 @@
+from __future__ import annotations
+import random
+from . import board
+
+# The keys come from a fixed seed so that a position hashes to the same value in every process and run
+_rng = random.Random("quoridor-zobrist")
+
+PAWN_KEYS = [[_rng.getrandbits(64) for _ in range(board.CELLS)] for _ in range(2)]
+WALL_KEYS = {orientation: [_rng.getrandbits(64) for _ in range(board.WALL_SIZE * board.WALL_SIZE)]
+             for orientation in ["v", "h"]}
+WALLS_LEFT_KEYS = [[_rng.getrandbits(64) for _ in range(board.WALLS_PER_PLAYER + 1)] for _ in range(2)]
+SIDE_KEY = _rng.getrandbits(64)
+
+
+def full_key(pawns: int, horizontal_walls: int, vertical_walls: int, agent_to_move: int,
+             walls_left: tuple[int, int]) -> int:
+    """Computes a position's key from scratch; actions keep it up to date incrementally"""
+    key = SIDE_KEY if agent_to_move else 0
+    for agent_index in range(2):
+        key ^= PAWN_KEYS[agent_index][pawns >> board.PAWN_SHIFT[agent_index] & board.PAWN_MASK]
+        key ^= WALLS_LEFT_KEYS[agent_index][walls_left[agent_index]]
+    for slot in range(board.WALL_SIZE * board.WALL_SIZE):
+        if vertical_walls >> slot & 1:
+            key ^= WALL_KEYS["v"][slot]
+        if horizontal_walls >> slot & 1:
+            key ^= WALL_KEYS["h"][slot]
+    return key
@@ -0,0 +1,110 @@
+"""
+Load test for server.py: opens many connections at once, each playing games with random legal moves,
+and reports games per second and how long the server took to answer each move.
+
+    python server.py --move-time 0.01 &
+    python loadtest.py --connections 200 --games 2
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from domain import *
+import domain.movegen as movegen
+
+
+class LoadTest:
+
+    def __init__(self, host: str, port: int, agent: str, clock: float, max_plies: int):
+        self.host = host
+        self.port = port
+        self.agent = agent
+        self.clock = clock
+        self.max_plies = max_plies
+        self.latencies = []
+        self.results = {}
+        self.errors = 0
+
+    async def play(self, connection: int, games: int, seed: int):
+        rng = random.Random("%i/%i" % (seed, connection))
+        reader, writer = await asyncio.open_connection(self.host, self.port, limit=1 << 16)
+
+        async def receive() -> list[str]:
+            return (await reader.readline()).decode().split()
+
+        await receive()
+        for game in range(games):
+            side = 1 + (connection + game) % 2
+            writer.write(("new %s %i %g\n" % (self.agent, side, self.clock)).encode())
+            await writer.drain()
+            words = await receive()
+            if words[0] != "GAME":
+                self.errors += 1
+                continue
+            state = initial_state.detached_copy()
+            plies = 0
+            while True:
+                if state.is_terminal():
+                    # The agent's winning move is followed by the END line
+                    words = await receive()
+                    break
+                if state.agent_to_move == side - 1:
+                    if plies >= self.max_plies:
+                        writer.write(b"resign\n")
+                        await writer.drain()
+                        words = await receive()
+                        break
+                    action = DEFAULT_QUORIDOR_ACTION_LIBRARY[movegen.random_legal_action_id(state, rng)]
+                    state.apply(action, undoable=False)
+                    plies += 1
+                    sent = time.perf_counter()
+                    writer.write((action_to_string(action) + "\n").encode())
+                    await writer.drain()
+                    words = await receive()
+                    self.latencies.append(time.perf_counter() - sent)
+                else:
+                    words = await receive()
+                if not words or words[0] == "END":
+                    break
+                if words[0] == "MOVE":
+                    state.apply(get_action_from_string(words[1]), undoable=False)
+                    plies += 1
+                else:
+                    self.errors += 1
+                    break
+            reason = words[2] if len(words) > 2 else "error"
+            self.results[reason] = self.results.get(reason, 0) + 1
+        writer.write(b"quit\n")
+        await writer.drain()
+        writer.close()
+
+    async def run(self, connections: int, games: int, seed: int = 0) -> dict:
+        start = time.perf_counter()
+        await asyncio.gather(*[self.play(connection, games, seed) for connection in range(connections)])
+        elapsed = time.perf_counter() - start
+        latencies = sorted(self.latencies)
+        report = {"games": sum(self.results.values()), "seconds": elapsed,
+                  "games_per_second": sum(self.results.values()) / elapsed,
+                  "moves": len(latencies), "results": self.results, "errors": self.errors}
+        if latencies:
+            percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+            report["latency_ms"] = {"p50": 1000 * percentiles[49], "p90": 1000 * percentiles[89],
+                                    "p99": 1000 * percentiles[98], "max": 1000 * latencies[-1]}
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays many concurrent random games against server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--games", type=int, default=1, help="games per connection")
+    parser.add_argument("--agent", default="mcts")
+    parser.add_argument("--clock", type=float, default=300.0)
+    parser.add_argument("--max-plies", type=int, default=200, help="the client resigns once a game is this many plies long")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(asyncio.run(LoadTest(args.host, args.port, args.agent, args.clock, args.max_plies)
+                      .run(args.connections, args.games, args.seed)))
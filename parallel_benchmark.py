@@ -0,0 +1,102 @@
+"""
+Benchmarks parallel MCTS (agents.parallel_mcts) against the number of worker processes.
+
+For each mode (root and tree parallelism) and worker count it measures playouts per second over a fixed set of
+positions, then plays games against a single-process MCTSAgent with the same time per move, starting in turn,
+and reports the score and the Elo difference with a 95% error bar.
+
+    python parallel_benchmark.py --workers 1 2 4 8 --move-time 1.0 --games 20
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import time
+import domain.race as race
+from agents.mcts import MCTSAgent
+from agents.parallel_mcts import ParallelMCTSAgent, ROOT, TREE
+from arena import play_agents, elo_ratings, report
+from benchmark import sample_states
+
+BASELINE = "mcts"
+
+
+def benchmark_positions(count: int, seed: int = 0) -> list:
+    """Positions from seeded random games that still need a search: not finished and not a pawn race"""
+    return [state for state in sample_states(4 * count, seed) if not state.is_terminal() and not race.is_race(state)][:count]
+
+
+def playouts_per_second(agent: MCTSAgent, positions: list) -> float:
+    iterations = 0
+    elapsed = 0.0
+    for state in positions:
+        # No tree is kept between unrelated positions
+        agent.root = None
+        start = time.perf_counter()
+        agent.get_action(state)
+        elapsed += time.perf_counter() - start
+        iterations += agent.last_iterations
+    return iterations / elapsed
+
+
+def strength(agent: ParallelMCTSAgent, name: str, games: int, move_time: float, max_plies: int, seed: int) -> dict:
+    """Plays `games` games against a single-process MCTSAgent and reports them like arena.report"""
+    results = []
+    for game in range(games):
+        agent.root = None
+        baseline = MCTSAgent(iterations=None, time_limit=move_time, rng=random.Random("%i/%i" % (seed, game)))
+        names = (name, BASELINE) if game % 2 == 0 else (BASELINE, name)
+        agents = [agent, baseline] if game % 2 == 0 else [baseline, agent]
+        result = play_agents(agents, move_time, max_plies)
+        result["agents"] = list(names)
+        results.append(result)
+    summary = report([name, BASELINE], results)
+    ratings = elo_ratings([name, BASELINE], results)
+    # The ratings are anchored at a mean of 0, so the difference is twice the agent's rating
+    summary["elo_difference"] = round(2 * ratings[name][0], 1)
+    summary["elo_difference_error"] = round(2 * ratings[name][1], 1)
+    return summary
+
+
+def run(worker_counts: list[int], modes: list[str], move_time: float, games: int, positions: int,
+        max_plies: int, seed: int, verbose: bool = False) -> dict:
+    states = benchmark_positions(positions, seed)
+    results = {"cpus": os.cpu_count(), "move_time": move_time, "modes": {}}
+    for mode in modes:
+        results["modes"][mode] = {}
+        for workers in worker_counts:
+            name = "mcts-%s-%i" % (mode, workers)
+            with ParallelMCTSAgent(workers, mode, iterations=None, time_limit=move_time,
+                                   rng=random.Random(seed)) as agent:
+                agent.start()
+                entry = {"playouts_per_second": round(playouts_per_second(agent, states), 1)}
+                if games:
+                    match = strength(agent, name, games, move_time, max_plies, seed)
+                    entry.update({"score": match["agents"][name]["score"], "games": games,
+                                  "elo_difference": match["elo_difference"],
+                                  "elo_difference_error": match["elo_difference_error"],
+                                  "endings": match["endings"]})
+            results["modes"][mode][workers] = entry
+            if verbose:
+                print(name, json.dumps(entry))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Playouts per second and strength of parallel MCTS by worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=[ROOT, TREE], default=[ROOT, TREE])
+    parser.add_argument("--move-time", type=float, default=1.0, help="time limit per move, in seconds")
+    parser.add_argument("--games", type=int, default=10, help="games against single-process MCTS per setting")
+    parser.add_argument("--positions", type=int, default=10, help="positions for measuring playouts per second")
+    parser.add_argument("--max-plies", type=int, default=200, help="games this long are drawn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    args = parser.parse_args()
+    results = run(args.workers, args.modes, args.move_time, args.games, args.positions, args.max_plies, args.seed,
+                  verbose=True)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
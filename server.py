@@ -0,0 +1,196 @@
+"""
+An asyncio TCP server that hosts many games between clients and the built-in agents at once.
+
+Every connection plays one game at a time. Lines are UTF-8 and end with a newline; actions use the same
+syntax as the game scripts ("mn", "jne", "w34v", see domain.actions.get_action_from_string).
+
+    server: HELLO quoridor
+    client: new [agent] [side] [seconds]     agent is one of AGENTS (default mcts), side 1 or 2 (default 1),
+                                             seconds is each side's clock for the whole game
+    server: GAME <game id> <side> <seconds>
+    server: MOVE <action>                    whenever the agent moves, including the first move if it starts
+    client: <action>                         a move for the client's side
+    server: END <winner> <reason>            reason is goal, timeout or resign; the connection stays open
+    client: board                            the board as BOARD <number of lines>, followed by those lines
+    client: resign / quit
+    server: ERROR <message>                  the game goes on after an error, e.g. an illegal move
+
+Agent moves run in a process pool so that a long search never holds up the other games.
+
+    python server.py [--host 127.0.0.1] [--port 8765] [--workers N] [--move-time 1.0]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from domain import *
+from agents import AGENTS
+
+DEFAULT_CLOCK = 300.0
+# An agent never spends more than this share of its remaining clock on one move
+CLOCK_SHARE_PER_MOVE = 0.05
+
+_game_ids = itertools.count(1)
+
+
+def agent_move(agent_name: str, state: QuoridorState, time_limit: float) -> tuple[str, float]:
+    """
+    Runs in a worker process and returns the action as a string, since the state is a fresh copy there,
+    along with the time spent thinking; time spent waiting for a free worker is not charged to the agent.
+    """
+    started = time.perf_counter()
+    action = AGENTS[agent_name](time_limit).get_action(state)
+    return action_to_string(action), time.perf_counter() - started
+
+
+class Game:
+
+    def __init__(self, agent_name: str, client_side: int, clock: float):
+        self.id = next(_game_ids)
+        self.agent_name = agent_name
+        self.client_index = client_side - 1
+        # Detached so that a long game does not keep a chain of parent states alive
+        self.state = initial_state.detached_copy()
+        # Seconds left on each agent's clock
+        self.clocks = [clock, clock]
+
+
+class GameServer:
+
+    def __init__(self, workers: int = None, move_time: float = 1.0):
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.move_time = move_time
+        self.games_started = 0
+        self.games_finished = 0
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        def send(line: str):
+            writer.write((line + "\n").encode())
+
+        send("HELLO quoridor")
+        game = None
+        try:
+            while True:
+                timeout = None
+                if game is not None and game.state.agent_to_move == game.client_index:
+                    timeout = max(0.0, game.clocks[game.client_index])
+                waited_from = time.perf_counter()
+                try:
+                    line = await asyncio.wait_for(reader.readline(), timeout)
+                except asyncio.TimeoutError:
+                    self._finish(game, send, 1 - game.client_index, "timeout")
+                    game = None
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                if timeout is not None:
+                    game.clocks[game.client_index] -= time.perf_counter() - waited_from
+                words = line.decode(errors="replace").split()
+                if not words:
+                    continue
+                command = words[0].lower()
+                if command == "quit":
+                    send("BYE")
+                    break
+                if command == "new":
+                    game = self._new_game(words[1:], send)
+                    if game is not None and game.state.agent_to_move != game.client_index:
+                        game = await self._agent_turn(game, send)
+                elif command == "board":
+                    if game is None:
+                        send("ERROR no game")
+                    else:
+                        lines = repr(game.state).splitlines()
+                        send("BOARD %i" % len(lines))
+                        for board_line in lines:
+                            send(board_line)
+                elif game is None:
+                    send("ERROR no game, start one with: new [agent] [side] [seconds]")
+                elif command == "resign":
+                    self._finish(game, send, 1 - game.client_index, "resign")
+                    game = None
+                elif game.state.agent_to_move != game.client_index:
+                    send("ERROR not your turn")
+                else:
+                    action_id = parse_action_id("".join(words))
+                    if action_id is None:
+                        send("ERROR not an action: %s" % " ".join(words))
+                    elif not game.state.is_legal(action_id):
+                        send("ERROR not applicable: %s" % action_id_to_string(action_id))
+                    else:
+                        game.state = game.state.result(DEFAULT_QUORIDOR_ACTION_LIBRARY[action_id])
+                        if game.state.is_terminal():
+                            self._finish(game, send, game.state.get_winner() - 1, "goal")
+                            game = None
+                        else:
+                            game = await self._agent_turn(game, send)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _new_game(self, arguments: list[str], send) -> Game:
+        try:
+            agent_name = arguments[0] if len(arguments) > 0 else "mcts"
+            client_side = int(arguments[1]) if len(arguments) > 1 else 1
+            clock = float(arguments[2]) if len(arguments) > 2 else DEFAULT_CLOCK
+        except ValueError:
+            send("ERROR usage: new [agent] [side] [seconds]")
+            return None
+        if agent_name not in AGENTS or client_side not in (1, 2) or clock <= 0:
+            send("ERROR usage: new [%s] [1|2] [seconds]" % "|".join(AGENTS))
+            return None
+        game = Game(agent_name, client_side, clock)
+        self.games_started += 1
+        send("GAME %i %i %g" % (game.id, client_side, clock))
+        return game
+
+    async def _agent_turn(self, game: Game, send) -> Game:
+        """Plays the agent's move and returns the game, or None once it is over"""
+        agent_index = 1 - game.client_index
+        time_limit = min(self.move_time, CLOCK_SHARE_PER_MOVE * game.clocks[agent_index])
+        # The state goes to the worker without its parents, which would otherwise be pickled along with it
+        action_string, elapsed = await asyncio.get_running_loop().run_in_executor(
+            self.pool, agent_move, game.agent_name, game.state.detached_copy(), time_limit)
+        game.clocks[agent_index] -= elapsed
+        if game.clocks[agent_index] < 0:
+            self._finish(game, send, game.client_index, "timeout")
+            return None
+        game.state = game.state.result(get_action_from_string(action_string))
+        send("MOVE %s" % action_string)
+        if game.state.is_terminal():
+            self._finish(game, send, game.state.get_winner() - 1, "goal")
+            return None
+        return game
+
+    def _finish(self, game: Game, send, winner_index: int, reason: str):
+        self.games_finished += 1
+        send("END %i %s" % (winner_index + 1, reason))
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port, limit=1 << 16)
+        print("Serving on %s:%i" % (host, port))
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hosts Quoridor games against the built-in agents over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="processes for agent moves (default: one per CPU)")
+    parser.add_argument("--move-time", type=float, default=1.0, help="longest an agent thinks about one move, in seconds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(GameServer(args.workers, args.move_time).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
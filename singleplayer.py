@@ -1,24 +1,9 @@
+import sys
 from domain import *
+from agents import AGENTS
 
-agent = None
-
-def get_action_from_string(string):
-    action = None
-    if len(string) == 2:
-        if string[0].lower() == "m":
-            if string[1].lower() in ['n', 's', 'e', 'w']:
-                action = MoveAction(string[1].upper())
-        elif string[0].lower() == "j":
-            if string[1].lower() in ['n', 's', 'e', 'w']:
-                action = JumpStraightAction(string[1].upper())
-    elif len(string) == 3 and string[0].lower() == "j":
-        temp_action = JumpSideAction(string[1].upper(), string[2].upper())
-        if temp_action in DEFAULT_QUORIDOR_ACTION_LIBRARY:
-            action = temp_action
-    elif len(string) == 4 and string[0].lower() == "w":
-        if string[1] in [str(i) for i in range(9)] and string[2] in [str(i) for i in range(9)] and string[3].lower() in ["v", "h"]:
-            action = WallAction((int(string[1]), int(string[2])), string[3])
-    return action
+# Each agent thinks for 10 seconds a move
+agent = AGENTS[sys.argv[1] if len(sys.argv) > 1 else "mcts"](10)
 
 current_state = initial_state
 
@@ -30,15 +15,14 @@ while True:
         break
     #print(current_state.get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY))
     input_string = input("What is your move?\n")
-    action = get_action_from_string(input_string)
-    if action == None:
+    action_id = parse_action_id(input_string)
+    if action_id is None:
         print("Not legal input")
         continue
-    if action not in current_state.get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY):
-        #print(action)
+    if not current_state.is_legal(action_id):
         print("Not legal action")
         continue
-    current_state = current_state.result(action)
+    current_state = current_state.result(DEFAULT_QUORIDOR_ACTION_LIBRARY[action_id])
     print(current_state)
     if current_state.is_terminal():
         winner = current_state.get_winner()
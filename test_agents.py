@@ -0,0 +1,111 @@
+"""
+Behaviour checks of the search agents on a small board, where they see to the end of the game quickly.
+
+    python -m pytest test_agents.py
+"""
+from __future__ import annotations
+import random
+import pytest
+import domain.engine as engine
+import domain.race as race
+from domain import *
+from agents.alphabeta import AlphaBetaAgent, WIN_SCORE, WIN_THRESHOLD, score_from_table, score_to_table
+from agents.batched import batched_win_counts
+from agents.book import BookBuilder, OpeningBook
+from agents.mcts import MCTSAgent
+
+small = engine.load(5, 3)
+LIBRARY = small.DEFAULT_QUORIDOR_ACTION_LIBRARY
+
+
+def positions_with_a_winning_move(count: int, seed: int = 0):
+    """
+    Positions where the agent to move can win at once, reached by random pawn moves so that both agents
+    still have all their walls and the race solver does not answer for the search
+    """
+    rng = random.Random(seed)
+    pawn_actions = [action for action in LIBRARY if not isinstance(action, small.WallAction)]
+    found = 0
+    while found < count:
+        state = small.initial_state.detached_copy()
+        while not state.is_terminal():
+            legal = [action for action in pawn_actions if state.is_applicable(action)]
+            if any(state.result(action).is_terminal() for action in legal):
+                found += 1
+                yield state
+                break
+            state.apply(rng.choice(legal), undoable=False)
+
+
+def test_alphabeta_takes_the_win():
+    agent = AlphaBetaAgent(time_limit=10.0, max_depth=3, engine=small)
+    for state in positions_with_a_winning_move(10):
+        action = agent.get_action(state)
+        assert state.is_applicable(action)
+        assert state.result(action).is_terminal()
+        assert agent.last_score == WIN_SCORE - 1
+
+
+def test_alphabeta_without_time_still_moves():
+    agent = AlphaBetaAgent(time_limit=0.0, engine=small)
+    state = small.initial_state.detached_copy()
+    assert state.is_applicable(agent.get_action(state))
+
+
+def test_table_scores_are_relative_to_the_node():
+    for score in (WIN_SCORE - 7, -(WIN_SCORE - 7), 12.5, WIN_THRESHOLD - 1):
+        for ply in (0, 3, 10):
+            assert score_from_table(score_to_table(score, ply), ply) == score
+    # A win found 7 plies from the root at ply 3 is a win in 4 from that node, wherever it is found again
+    assert score_from_table(score_to_table(WIN_SCORE - 7, 3), 5) == WIN_SCORE - 9
+
+
+def test_book_lookup_matches_what_was_added(tmp_path):
+    rng = random.Random(5)
+    builder = BookBuilder()
+    expected = {}
+    for _ in range(30):
+        state = initial_state.detached_copy()
+        game = []
+        for _ in range(4):
+            game.append(rng.choice(state.get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY)))
+            state.apply(game[-1], undoable=False)
+        builder.add_game(game, winner=rng.choice([1, 2]), max_plies=2)
+        expected[game[0]] = expected.get(game[0], 0) + 1
+    builder.write(str(tmp_path / "opening.qbook"))
+    with OpeningBook(str(tmp_path / "opening.qbook")) as book:
+        assert len(book) == len(builder)
+        entries = book.lookup(initial_state)
+        assert {entry.action: entry.visits for entry in entries} == expected
+        assert all(0 <= entry.win_rate <= 1 for entry in entries)
+        best_action = book.best_action(initial_state)
+        assert expected[best_action] == max(expected.values())
+        assert AlphaBetaAgent(book=book).get_action(initial_state) == best_action
+        # Past the plies that were added the book knows nothing and the agents search instead
+        assert book.lookup(state) == [] and book.best_action(state) is None
+
+
+def test_mcts_without_iteration_cap_searches_until_the_time_limit():
+    agent = MCTSAgent(iterations=None, time_limit=0.2, rng=random.Random(0), engine=small)
+    state = small.initial_state.detached_copy()
+    assert state.is_applicable(agent.get_action(state))
+    assert agent.last_iterations > 1
+    with pytest.raises(ValueError):
+        MCTSAgent(iterations=None, time_limit=None)
+
+
+def test_batched_playouts_end_races_with_the_solver():
+    rng = random.Random(6)
+    races = []
+    while len(races) < 5:
+        state = initial_state.detached_copy()
+        while not state.is_terminal() and not race.is_race(state):
+            state.apply(rng.choice(state.get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY)), undoable=False)
+        if not state.is_terminal():
+            races.append(state)
+    counts = batched_win_counts(races, 10, seed=0)
+    for state, state_counts in zip(races, counts):
+        # Every game from a race ends at once with the solver's winner; drawn races count for nobody
+        winner = race.winner(state)
+        expected = [0, 0] if winner is None else [10 * (winner == 1), 10 * (winner == 2)]
+        assert list(state_counts) == expected
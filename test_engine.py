@@ -0,0 +1,185 @@
+"""
+Consistency checks of the engine on a small board, where positions are cheap enough to check exhaustively:
+each fast path against the slow, obvious way of computing the same thing.
+
+    python -m pytest test_engine.py
+"""
+from __future__ import annotations
+import random
+import domain.engine as engine
+
+small = engine.load(5, 3)
+LIBRARY = small.DEFAULT_QUORIDOR_ACTION_LIBRARY
+
+
+def random_games(count: int, seed: int = 0, walls_first: bool = False):
+    """Yields every state of `count` seeded random games; with walls_first, walls are placed while there are any"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        state = small.initial_state.detached_copy()
+        yield state.detached_copy()
+        while not state.is_terminal() and state.path_cost < 200:
+            legal = state.get_applicable_actions(LIBRARY)
+            walls = [action for action in legal if isinstance(action, small.WallAction)]
+            state.apply(rng.choice(walls if walls_first and walls else legal), undoable=False)
+            yield state.detached_copy()
+
+
+def has_path_from_scratch(state, blocked: int, agent_index: int) -> bool:
+    distance_map = small.distances.distance_map(small.board.GOAL_MASKS[agent_index], blocked)
+    return distance_map[state.agent_cell(agent_index)] < small.distances.UNREACHABLE
+
+
+def test_wall_legality_is_exact():
+    # A wall is legal when it fits between the walls on the board and both pawns still reach their goal rows
+    for state in random_games(40):
+        me = state.agent_to_move
+        for action in small.WALL_ACTIONS:
+            fits = state.walls_left[me] > 0 and bool(state.placeable_walls >> action.wall_id & 1)
+            expected = fits and all(has_path_from_scratch(state, state.blocked | action.cut, agent_index)
+                                    for agent_index in range(2))
+            assert state.detached_copy().is_applicable(action) == expected, (state, action)
+
+
+def test_legal_action_mask_agrees():
+    for state in random_games(40):
+        applicable = state.get_applicable_actions(LIBRARY)
+        assert small.movegen.legal_actions(state.detached_copy()) == applicable
+        assert list(small.movegen.legal_action_mask(state)) == [action in applicable for action in LIBRARY]
+
+
+def full_key(state) -> int:
+    return small.zobrist.full_key(state.pawns, state.horizontal_walls, state.vertical_walls, state.agent_to_move,
+                                  state.walls_left)
+
+
+def test_incremental_key_matches_full_key():
+    positions = {}
+    for state in random_games(20, seed=4):
+        assert state.key == full_key(state)
+        # Equal positions reached by different games hash alike, so they can share set and table entries
+        assert positions.setdefault(state, state.key) == state.key
+
+
+def test_transposition_table_keeps_deep_entries():
+    from agents.transposition import TranspositionTable, LOWER_BOUND
+    table = TranspositionTable(size=4)
+    table.new_search()
+    table.store(1, depth=5, value=1.0)
+    # Same bucket (the table has two), shallower: goes to the always-replace slot
+    table.store(3, depth=1, value=2.0, flag=LOWER_BOUND)
+    assert table.probe(1).value == 1.0
+    assert table.probe(3)[1:4] == (1, 2.0, LOWER_BOUND)
+    assert table.probe(5) is None
+    # Entries of an older search give way to anything new
+    table.new_search()
+    table.store(5, depth=1, value=3.0)
+    assert table.probe(5).value == 3.0 and table.probe(1) is None
+
+
+def board_fields(state) -> tuple:
+    return (state.pawns, state.horizontal_walls, state.vertical_walls, state.blocked, state.agent_to_move,
+            state.walls_left, state.key, state.placeable_walls)
+
+
+def test_apply_undo_restores_state():
+    rng = random.Random(1)
+    for state in random_games(20, seed=1):
+        if state.is_terminal():
+            continue
+        before = board_fields(state)
+        legal = state.get_applicable_actions(LIBRARY)
+        for action in rng.sample(legal, min(3, len(legal))):
+            expected = board_fields(state.result(action))
+            state.apply(action)
+            assert board_fields(state) == expected
+            state.undo()
+            assert board_fields(state) == before
+
+
+def test_repaired_distances_match_from_scratch():
+    rng = random.Random(2)
+    for _ in range(30):
+        state = small.initial_state.detached_copy()
+        while not state.is_terminal():
+            # Computing the maps before every move makes each wall repair them instead of starting over
+            for agent_index in range(2):
+                state.distance_map(agent_index)
+            legal = state.get_applicable_actions(LIBRARY)
+            walls = [action for action in legal if isinstance(action, small.WallAction)]
+            state.apply(rng.choice(walls or legal), undoable=False)
+            for agent_index in range(2):
+                assert state.distance_map(agent_index) == small.distances.distance_map(
+                    small.board.GOAL_MASKS[agent_index], state.blocked)
+
+
+def brute_force_race(state) -> dict:
+    """
+    (value, plies) for the agent to move, like race.outcome, for every position reachable from state,
+    by plain retrograde analysis over the positions generated with get_applicable_actions
+    """
+    children = {}
+    frontier = [state]
+    while frontier:
+        position = frontier.pop()
+        if position in children:
+            continue
+        children[position] = [] if position.is_terminal() else [position.result(action) for action in
+                                                                 position.get_applicable_actions(LIBRARY)]
+        frontier.extend(children[position])
+    # The agent to move in a finished game has lost; every round settles the positions that end one ply later
+    solved = {position: (small.race.LOSS, 0) for position, moves in children.items() if not moves}
+    plies = 0
+    while True:
+        plies += 1
+        settled = {}
+        for position, moves in children.items():
+            if position in solved:
+                continue
+            results = [solved.get(child) for child in moves]
+            if any(result == (small.race.LOSS, plies - 1) for result in results):
+                settled[position] = (small.race.WIN, plies)
+            elif (all(result is not None and result[0] == small.race.WIN for result in results)
+                  and max(result[1] for result in results) == plies - 1):
+                settled[position] = (small.race.LOSS, plies)
+        if not settled:
+            break
+        solved.update(settled)
+    return {position: solved.get(position, (small.race.DRAW, None)) for position in children}
+
+
+def test_race_solver_matches_brute_force():
+    checked = 0
+    seen_layouts = set()
+    for state in random_games(60, seed=3, walls_first=True):
+        if not small.race.is_race(state) or state.blocked in seen_layouts:
+            continue
+        seen_layouts.add(state.blocked)
+        for position, (value, plies) in brute_force_race(state).items():
+            solver_value, solver_plies = small.race.outcome(position)
+            assert solver_value == value, position
+            assert small.race.winner(position) == small.race.solve(position).winner, position
+            if value != small.race.DRAW:
+                assert solver_plies == plies, position
+            checked += 1
+        if len(seen_layouts) == 5:
+            break
+    assert checked > 0
+
+
+def test_action_ids_and_is_legal_agree():
+    assert [action.id for action in LIBRARY] == list(range(len(LIBRARY)))
+    for state in random_games(40):
+        applicable = state.get_applicable_actions(LIBRARY)
+        assert [action for action in LIBRARY if state.is_legal(action.id)] == applicable
+
+
+def test_actions_are_interned():
+    import pickle
+    wall = small.WallAction((1, 2), "v")
+    assert wall is small.WallAction(position=(1, 2), orientation="V") is pickle.loads(pickle.dumps(wall))
+    assert small.JumpSideAction("N", agent_direction2="E") is LIBRARY[small.JumpSideAction("N", "E").id]
+    # Walls off the board are made on demand and not kept
+    interned = len(small.actions._interned)
+    assert small.WallAction((40, 2), "v").name == "Wall(40, 2, v)"
+    assert len(small.actions._interned) == interned
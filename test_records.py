@@ -0,0 +1,46 @@
+"""
+Round trips of domain.records: games written with RecordWriter come back from RecordReader unchanged.
+
+    python -m pytest test_records.py
+"""
+from __future__ import annotations
+import io
+import random
+import pytest
+from domain import *
+from domain.records import GameRecord, RecordReader, RecordWriter
+
+
+def random_game(seed: int, keep_action_log: bool = True) -> QuoridorState:
+    rng = random.Random(seed)
+    state = initial_state.detached_copy(keep_action_log=keep_action_log)
+    while not state.is_terminal() and state.path_cost < 300:
+        state = state.result(rng.choice(state.get_applicable_actions(DEFAULT_QUORIDOR_ACTION_LIBRARY)))
+    return state
+
+
+def test_write_state_round_trip():
+    games = [random_game(seed) for seed in range(5)]
+    file = io.BytesIO()
+    with RecordWriter(file) as writer:
+        for index, state in enumerate(games):
+            writer.write_state(state, {"game": index} if index % 2 else None)
+    file.seek(0)
+    records = list(RecordReader(file))
+    assert len(records) == len(games)
+    for index, (state, record) in enumerate(zip(games, records)):
+        assert record == GameRecord.from_state(state, {"game": index} if index % 2 else None)
+        assert record.actions() == state.history()
+        assert record.winner == (state.get_winner() if state.is_terminal() else 0)
+        assert record.replay() == state
+
+
+def test_from_state_needs_the_whole_game():
+    state = random_game(0)
+    # A detached state without a log, or with one started mid-game, no longer knows how the game began
+    with pytest.raises(ValueError):
+        GameRecord.from_state(state.detached_copy())
+    with pytest.raises(ValueError):
+        GameRecord.from_state(state.detached_copy(keep_action_log=True))
+    with pytest.raises(ValueError):
+        GameRecord.from_state(random_game(0, keep_action_log=False))
@@ -1,4 +1,5 @@
 from domain import *
 from agents import *
 
-print(simulate_games(initial_state, 0))
\ No newline at end of file
+if __name__ == "__main__":
+    print(simulate_games_parallel(initial_state, 1))